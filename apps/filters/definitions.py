@@ -0,0 +1,147 @@
+# Converters of returned values of filters, they are referenced by name in filter definitions
+CONVERTERS = {
+    'raw': lambda x: x,
+    'intcomma': lambda x: f"{x:,}",
+    'round2': lambda x: round(x, 2),
+    'round2_intcomma': lambda x: f"{round(x, 2):,}",
+    'million': lambda x: f"{round(x / 1e6, 2):,} M",
+    'million_plain': lambda x: f"{round(x / 1e6, 2)} M",
+    'billion': lambda x: f"{round(x / 1e9, 2):,} B",
+    'billion_round': lambda x: f"{round(x / 1e9):,} B",
+    'time': lambda x: x.strftime("%H:%M:%S"),
+}
+
+# Derived columns which can be used in expressions of all filters
+DERIVED_COLUMNS = {
+    'kharid_avg': 'buy_i_volume * pc / buy_counti',
+    'foroush_avg': 'sell_i_volume * pc / sell_counti',
+    'saraneh': 'kharid_avg / foroush_avg',
+    'tvol_tta': 'tvol / total_transaction_average',
+    'entered_money': 'pc * (buy_i_volume - sell_i_volume)',
+}
+
+SARANEH_PREDICATES = [
+    'buy_counti > 0', 'buy_i_volume > 0', 'sell_counti > 0', 'sell_i_volume > 0', 'foroush_avg > 0'
+]
+
+# Definitions of filters by their filter codes, see `CompiledFilter` for keys of definition.
+# Definition of SignalFilter object overrides the definition of its filter code.
+FILTER_DEFINITIONS = {
+    'saf_kharid': {
+        # pl > 0.2 * py + 0.8 * tmax, compared in integers
+        'where': ['pl < tmax', '5 * pl > py + 4 * tmax'],
+        'values': ['name', 'pl', 'plp', 'pc'],
+        'converters': ['raw', 'intcomma', 'raw', 'intcomma'],
+    },
+    'saf_foroush': {
+        # pl < 0.2 * py + 0.8 * tmin, compared in integers
+        'where': ['pl > tmin', '5 * pl < py + 4 * tmin'],
+        'values': ['name', 'pl', 'plp', 'pc'],
+        'converters': ['raw', 'intcomma', 'raw', 'intcomma'],
+    },
+    'hajm_mashkouk': {
+        'where': ['total_transaction_average > 0'],
+        'order_by': '-tvol_tta',
+        'limit': 15,
+        'values': ['name', 'pl', 'plp', 'tvol', 'tvol_tta'],
+        'converters': ['raw', 'intcomma', 'raw', 'million', 'round2_intcomma'],
+    },
+    'foroush_bishtar': {
+        'where': SARANEH_PREDICATES,
+        'order_by': '-saraneh',
+        'limit': 15,
+        'values': ['name', 'pl', 'kharid_avg', 'foroush_avg', 'saraneh'],
+        'converters': ['raw', 'intcomma', 'million', 'million', 'round2'],
+    },
+    'foroush_kamtar': {
+        'where': SARANEH_PREDICATES,
+        'order_by': 'saraneh',
+        'limit': 15,
+        'values': ['name', 'pl', 'kharid_avg', 'foroush_avg', 'saraneh'],
+        'converters': ['raw', 'intcomma', 'million', 'million', 'round2'],
+    },
+    'cbc_haqiqi': {
+        'where': ['tvol > 0', 'buy_n_volume / tvol > 0.5', 'sell_i_volume / tvol > 0.7'],
+        'values': ['name', 'pl', 'sell_i_volume', 'buy_n_volume'],
+        'converters': ['raw', 'intcomma', 'million_plain', 'million_plain'],
+    },
+    'cbc_hoqouqi': {
+        'where': ['tvol > 0', 'sell_n_volume / tvol > 0.5', 'buy_i_volume / tvol > 0.7'],
+        'values': ['name', 'pl', 'buy_i_volume', 'sell_n_volume'],
+        'converters': ['raw', 'intcomma', 'million_plain', 'million_plain'],
+    },
+    'taqaza_bartar': {
+        'where': ['pl == tmax'],
+        'columns': {'top_demand_q': 'pl * qd1'},
+        'order_by': '-top_demand_q',
+        'limit': 15,
+        'values': ['name', 'pl', 'top_demand_q', 'pc'],
+        'converters': ['raw', 'intcomma', 'billion_round', 'intcomma'],
+    },
+    'arzeh_bartar': {
+        'where': ['pl == tmin'],
+        'columns': {'top_supply_q': 'pl * qo1'},
+        'order_by': '-top_supply_q',
+        'limit': 15,
+        'values': ['name', 'pl', 'top_supply_q', 'pc'],
+        'converters': ['raw', 'intcomma', 'billion_round', 'intcomma'],
+    },
+    'kharid_haqiqi': {
+        'where': ['buy_counti > 0', 'sell_counti > 0'],
+        'order_by': '-kharid_avg',
+        'limit': 15,
+        'values': ['name', 'pl', 'plp', 'kharid_avg', 'buy_counti', 'saraneh'],
+        'converters': ['raw', 'intcomma', 'raw', 'million', 'intcomma', 'round2'],
+    },
+    'foroush_haqiqi': {
+        'where': ['buy_counti > 0', 'sell_counti > 0', 'sell_i_volume > 0'],
+        'order_by': '-foroush_avg',
+        'limit': 15,
+        'values': ['name', 'pl', 'plp', 'foroush_avg', 'sell_counti', 'foroush_avg / kharid_avg'],
+        'converters': ['raw', 'intcomma', 'raw', 'million', 'intcomma', 'round2'],
+    },
+    'sharpi': {
+        'where': ['yesterday_at_tmax', 'pmax == tmax', 'pl < pmax'],
+        'values': ['name', 'pl', 'plp', 'pc'],
+        'converters': ['raw', 'intcomma', 'raw', 'intcomma'],
+    },
+    'range_mosbat': {
+        'function': 'range_mosbat',
+        'converters': ['raw', 'intcomma', 'raw', 'intcomma', 'raw', 'time'],
+    },
+    'por_taqaza': {
+        'group_by': 'group_name',
+        'where': ['sum(buy_i_volume) > 0', 'sum(buy_counti) > 0', 'sum(sell_i_volume) > 0', 'sum(sell_counti) > 0'],
+        'columns': {
+            'saraneh_kharid': 'sum(buy_i_volume) / sum(buy_counti)',
+            'saraneh_foroush': 'sum(sell_i_volume) / sum(sell_counti)',
+        },
+        'order_by': '-(saraneh_kharid / saraneh_foroush)',
+        'limit': 15,
+        'values': ['group_name', 'saraneh_kharid / saraneh_foroush', 'sum(entered_money)'],
+        'converters': ['raw', 'round2', 'billion'],
+    },
+    'kharid_forosh_mashkouk': {
+        'function': 'kharid_forosh_mashkouk',
+        'converters': [
+            'time', 'raw', 'raw', 'billion', 'billion', 'billion', 'round2_intcomma', 'intcomma'
+        ],
+    },
+    'shekar_navasani': {
+        'where': [
+            'total_transaction_average > 0', 'buy_counti > 30', 'sell_counti > 0', 'foroush_avg > 0',
+            'saraneh > 2', 'kharid_avg > 100 * 1e6', 'tvol_tta > 1'
+        ],
+        'values': ['name', 'pl', 'plp', 'tvol_tta', 'saraneh', 'entered_money'],
+        'converters': ['raw', 'intcomma', 'raw', 'round2_intcomma', 'round2_intcomma', 'billion'],
+    },
+    'tavajoh_haqiqi': {
+        'where': [
+            'buy_counti > 0', 'sell_counti > 0', 'total_transaction_average > 0', 'tvol > 0',
+            'saraneh_hajm > 10', 'sell_n_volume / tvol < 0.2', '(pl - monthly_min) * 1e2 / (monthly_max - monthly_min) < 20'
+        ],
+        'columns': {'saraneh_hajm': '(buy_i_volume / buy_counti) / (sell_i_volume / sell_counti)'},
+        'values': ['name', 'pl', 'plp', 'saraneh_hajm', 'entered_money', 'tvol_tta'],
+        'converters': ['raw', 'intcomma', 'raw', 'round2_intcomma', 'billion', 'round2_intcomma'],
+    },
+}
@@ -0,0 +1,138 @@
+import numpy as np
+from django.db.models import F, Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from apps.tsetmc.models import NamadHistory
+from apps.tsetmc.snapshots import SNAPSHOT_DTYPE, latest_snapshot
+
+# Columns which are read from histories of namads on their first use
+HISTORY_COLUMNS = ('yesterday_at_tmax', 'monthly_min', 'monthly_max')
+FRAME_COLUMNS = frozenset(SNAPSHOT_DTYPE.names + HISTORY_COLUMNS)
+MONTHLY_DAYS = 30
+
+
+def sorted_snapshot(snapshot):
+    """
+    :param snapshot: numpy structured array of SNAPSHOT_DTYPE
+    :return: rows of snapshot ordered by namad id, rows of the store are not in a stable order
+    """
+    return snapshot[np.argsort(snapshot['namad_id'], kind='stable')]
+
+
+class FilterFrame:
+    """
+    Columns of the latest stat of each namad as numpy arrays, columns of histories are read
+    on their first use. Filters are evaluated over these columns by `FilterPlan`.
+    """
+
+    def __init__(self, snapshot, version=None):
+        self.snapshot = snapshot
+        self.version = version
+        self._columns = {}
+
+    @classmethod
+    def load(cls, store=latest_snapshot):
+        """
+        This function will load the frame from the latest snapshot store, NamadStat is queried only if the
+        store is empty (Ex: after redis is flushed) and the store is filled by its result.
+        :param store: LatestSnapshot object
+        :return: FilterFrame object, its version is the version of the store which rows are read at
+        """
+        version, snapshot = store.load_versioned()
+        if not len(snapshot):
+            store.rebuild()
+            version, snapshot = store.load_versioned()
+        return cls(sorted_snapshot(snapshot), version)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            if name in HISTORY_COLUMNS:
+                self._columns[name] = getattr(self, name)
+            else:
+                self._columns[name] = np.ascontiguousarray(self.snapshot[name])
+        return self._columns[name]
+
+    def take(self, indexes):
+        """
+        :param indexes: array of indexes of rows
+        :return: FilterFrame of given rows, loaded columns are taken from this frame
+        """
+        frame = FilterFrame(self.snapshot[indexes])
+        frame._columns = {name: column[indexes] for name, column in self._columns.items()}
+        return frame
+
+    def update(self, indexes, rows):
+        """
+        This function will replace given rows of frame in place, loaded columns of histories are kept
+        since they do not change during the day.
+        :param indexes: array of indexes of rows
+        :param rows: numpy structured array of SNAPSHOT_DTYPE with the same length as indexes
+        """
+        if not self.snapshot.flags.writeable:
+            # Snapshots which are read from redis are read-only views of its buffer
+            self.snapshot = self.snapshot.copy()
+        self.snapshot[indexes] = rows
+        for name, column in self._columns.items():
+            if name not in HISTORY_COLUMNS:
+                column[indexes] = rows[name]
+
+    @staticmethod
+    def divide(numerator, denominator):
+        """
+        Divisions by zero give inf or nan values, filters should mask such rows before using them.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.true_divide(numerator, denominator, dtype=np.float64)
+
+    @cached_property
+    def yesterday_at_tmax(self):
+        """
+        :return: boolean array, True for namads which their last history is closed at tmax
+        """
+        history_last_records = NamadHistory.objects.values('namad_id').annotate(max_id=Max('id')).values('max_id')
+        namad_ids = NamadHistory.objects.filter(
+            pk__in=history_last_records,
+            pl=F('tmax')
+        ).values_list('namad_id', flat=True)
+        return np.isin(self['namad_id'], list(namad_ids))
+
+    @cached_property
+    def _monthly_range(self):
+        min_max = {
+            ns['namad_id']: (ns['min'], ns['max']) for ns in NamadHistory.objects.filter(
+                created_time__gt=timezone.now() - timezone.timedelta(days=MONTHLY_DAYS)
+            ).values(
+                'namad_id'
+            ).annotate(
+                max=Max('pl'),
+                min=Min('pl')
+            ).filter(
+                max__gt=F('min')
+            ).values(
+                'namad_id',
+                'max',
+                'min'
+            )
+        }
+        nan_range = (np.nan, np.nan)
+        return np.array(
+            [min_max.get(namad_id, nan_range) for namad_id in self['namad_id'].tolist()], dtype=np.float64
+        ).reshape(-1, 2)
+
+    @cached_property
+    def monthly_min(self):
+        """
+        :return: minimum pl of namads in the last month, nan if pl is not changed or there is no history
+        """
+        return self._monthly_range[:, 0]
+
+    @cached_property
+    def monthly_max(self):
+        """
+        :return: maximum pl of namads in the last month, nan if pl is not changed or there is no history
+        """
+        return self._monthly_range[:, 1]
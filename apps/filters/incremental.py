@@ -0,0 +1,183 @@
+import heapq
+from datetime import date
+
+import numpy as np
+
+from apps.tsetmc.snapshots import latest_snapshot
+from .engine import FilterFrame
+from .planner import Evaluator
+
+
+class FilterState:
+    """
+    Selection of a row-level filter over the frame of the last cycle. Predicates and sort keys of all rows
+    are kept, so only rows of changed namads are evaluated again. Top rows of ranked filters are kept with
+    their sort keys and are merged with changed rows by a heap, whole rows are sorted only if a row of the
+    top is dropped below rows which are not evaluated again.
+    """
+
+    def __init__(self, compiled_filter):
+        self.filter = compiled_filter
+        self.mask = None
+        self.keys = None
+        self.top = None
+
+    @property
+    def ranked(self):
+        return self.filter.order_by is not None and bool(self.filter.limit)
+
+    def evaluate(self, evaluator, size):
+        """
+        This function will evaluate predicates and sort keys of whole rows of the frame.
+        :param evaluator: Evaluator of the whole frame
+        :param size: count of rows of the frame
+        """
+        self.mask = np.ones(size, dtype=bool)
+        for predicate in self.filter.where:
+            self.mask &= evaluator.evaluate(predicate)
+        if self.filter.order_by is not None:
+            self.keys = np.array(np.broadcast_to(evaluator.evaluate(self.filter.order_by), (size,)))
+        self.top = self._sorted_top() if self.ranked else None
+
+    def update(self, indexes, evaluator):
+        """
+        This function will evaluate predicates and sort keys of given rows again.
+        :param indexes: array of indexes of changed rows in the frame
+        :param evaluator: Evaluator of a frame of changed rows
+        """
+        mask = np.ones(len(indexes), dtype=bool)
+        for predicate in self.filter.where:
+            mask &= evaluator.evaluate(predicate)
+        self.mask[indexes] = mask
+        if self.keys is not None:
+            self.keys[indexes] = np.broadcast_to(evaluator.evaluate(self.filter.order_by), (len(indexes),))
+        if self.ranked:
+            self.top = self._merged_top(indexes)
+
+    def _sorted_top(self):
+        indexes = np.flatnonzero(self.mask)
+        indexes = indexes[np.argsort(self.keys[indexes], kind='stable')][:self.filter.limit]
+        return [(k, i) for k, i in zip(self.keys[indexes].tolist(), indexes.tolist())]
+
+    def _merged_top(self, indexes):
+        # Rows are ordered by (key, index) like the stable sort of whole rows
+        changed = set(indexes.tolist())
+        candidates = [item for item in self.top if item[1] not in changed]
+        candidates.extend(
+            (self.keys[i].item(), i) for i in changed if self.mask[i]
+        )
+        if any(k != k for k, _ in candidates):
+            return self._sorted_top()
+
+        top = heapq.nsmallest(self.filter.limit, candidates)
+        # Rows which are not evaluated again are after the last row of the old top, if the old top was full
+        # the new top is valid only if it is full and it is not after the old one
+        if len(self.top) == self.filter.limit and (len(top) < self.filter.limit or top[-1] > self.top[-1]):
+            return self._sorted_top()
+        return top
+
+    def selection(self):
+        """
+        :return: array of indexes of selected rows in order
+        """
+        if self.ranked:
+            return np.array([i for _, i in self.top], dtype=np.intp)
+        indexes = np.flatnonzero(self.mask)
+        if self.keys is not None:
+            indexes = indexes[np.argsort(self.keys[indexes], kind='stable')]
+        return indexes[:self.filter.limit] if self.filter.limit else indexes
+
+
+class IncrementalFilters:
+    """
+    Keeps the frame and states of row-level filters of the last cycle in the worker process. Namads which
+    their rows are written to the latest snapshot store after the last cycle are read from the store and only
+    their rows are evaluated again. Grouped filters and filters of functions are evaluated over the whole
+    frame on each cycle. Whole frame is loaded and evaluated on the first cycle, on a new day, if definitions
+    are changed or if a changed namad is not in the frame.
+    """
+
+    def __init__(self, store=latest_snapshot):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        self.definitions = None
+        self.day = None
+        self.version = None
+        self.frame = None
+        self.positions = {}
+        self.states = {}
+
+    def evaluate(self, plan, definitions):
+        """
+        :param plan: FilterPlan of definitions
+        :param definitions: dict of filter code and its definition which plan is made of
+        :return: dict of filter code and its converted rows
+        """
+        updated = self.definitions == definitions and self.day == date.today() and self._update()
+        if not updated:
+            self._load(plan, definitions)
+
+        full_evaluator = Evaluator(self.frame)
+        results = {}
+        for code, compiled_filter in plan.filters.items():
+            state = self.states.get(code)
+            if state is None:
+                results[code] = compiled_filter.evaluate(self.frame, full_evaluator)
+                continue
+
+            indexes = state.selection()
+            selected = self.frame.take(indexes)
+            results[code] = compiled_filter.convert(zip(*(
+                np.broadcast_to(Evaluator(selected).evaluate(v), (len(indexes),)).tolist()
+                for v in compiled_filter.values
+            )))
+
+        return results
+
+    def _load(self, plan, definitions):
+        # Rows and version are read together, rows which are written after them are read on the next cycle
+        self.frame = FilterFrame.load(self.store)
+        self.version = self.frame.version
+        self.positions = {namad_id: i for i, namad_id in enumerate(self.frame['namad_id'].tolist())}
+        self.definitions = definitions
+        self.day = date.today()
+
+        evaluator = Evaluator(self.frame)
+        self.states = {
+            code: FilterState(f) for code, f in plan.filters.items() if not f.function and not f.group_by
+        }
+        for state in self.states.values():
+            state.evaluate(evaluator, len(self.frame))
+
+    def _update(self):
+        """
+        This function will read changed rows from the store and evaluate filters for them.
+        :return: False if whole frame should be loaded again
+        """
+        if self.frame is None:
+            return False
+
+        version, namad_ids = self.store.changes(self.version)
+        if version < self.version:
+            # The store is cleared after the last cycle
+            return False
+        if not namad_ids:
+            return True
+
+        rows = self.store.load(namad_ids)
+        positions = [self.positions.get(namad_id) for namad_id in rows['namad_id'].tolist()]
+        if None in positions:
+            return False
+
+        indexes = np.array(positions, dtype=np.intp)
+        self.frame.update(indexes, rows)
+        evaluator = Evaluator(self.frame.take(indexes))
+        for state in self.states.values():
+            state.update(indexes, evaluator)
+        self.version = version
+        return True
+
+
+incremental_filters = IncrementalFilters()
@@ -32,6 +32,8 @@ class SignalFilter(models.Model):
     filter_code = models.CharField(_('filter code'), max_length=50, unique=True)
     category = models.ForeignKey('FilterCategory', on_delete=models.CASCADE, null=True, related_name='filters')
     is_enable = models.BooleanField(_('is enable'), default=True)
+    # Declarative definition of filter, see apps.filters.planner.CompiledFilter
+    definition = models.JSONField(_('definition'), blank=True, null=True)
 
     class Meta:
         verbose_name = _("Filter")
@@ -0,0 +1,271 @@
+import ast
+from collections import Counter
+
+import numpy as np
+
+from .definitions import CONVERTERS, DERIVED_COLUMNS
+from .engine import FRAME_COLUMNS, FilterFrame
+
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: FilterFrame.divide,
+}
+COMPARE_OPERATORS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+AGGREGATE_FUNCTIONS = ('sum',)
+
+
+class FilterDefinitionError(ValueError):
+    pass
+
+
+def compile_expression(text, columns=None, grouped=False, group_by=None):
+    """
+    This function will compile an expression of filter definition to a tree of tuples. Names of derived
+    columns are replaced by their expressions, so equal sub-expressions of filters have equal trees.
+    Only arithmetic, comparisons, `and`, `or`, `not`, numbers and columns are allowed, `sum(...)` is
+    allowed in grouped filters.
+    :param text: expression, Ex: 'kharid_avg > 100 * 1e6'
+    :param columns: dict of name and expression of filter's own derived columns
+    :param grouped: if True, expression is evaluated for groups of namads
+    :param group_by: name of column which namads are grouped by
+    :return: tuple tree of expression, Ex: ('cmp', ast.Gt, ('col', 'pl'), ('const', 0))
+    """
+    names = {**DERIVED_COLUMNS, **(columns or {})}
+
+    def _compile(node, stack, aggregated):
+        if isinstance(node, ast.Expression):
+            return _compile(node.body, stack, aggregated)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return 'const', node.value
+        if isinstance(node, ast.Name):
+            if node.id in stack:
+                raise FilterDefinitionError(f"Column {node.id} is defined by itself")
+            if node.id in names:
+                return _compile(_parse(names[node.id]), stack + (node.id,), aggregated)
+            if node.id not in FRAME_COLUMNS:
+                raise FilterDefinitionError(f"Unknown column: {node.id}")
+            if grouped and not aggregated:
+                if node.id != group_by:
+                    raise FilterDefinitionError(f"Column {node.id} should be aggregated")
+                return 'group', node.id
+            return 'col', node.id
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return 'bin', type(node.op), _compile(node.left, stack, aggregated), _compile(node.right, stack, aggregated)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.Not)):
+            return 'neg' if isinstance(node.op, ast.USub) else 'not', _compile(node.operand, stack, aggregated)
+        if isinstance(node, ast.BoolOp):
+            return (
+                'and' if isinstance(node.op, ast.And) else 'or',
+                tuple(_compile(v, stack, aggregated) for v in node.values)
+            )
+        if isinstance(node, ast.Compare) and all(type(op) in COMPARE_OPERATORS for op in node.ops):
+            operands = [_compile(v, stack, aggregated) for v in (node.left, *node.comparators)]
+            comparisons = tuple(
+                ('cmp', type(op), left, right) for op, left, right in zip(node.ops, operands, operands[1:])
+            )
+            return comparisons[0] if len(comparisons) == 1 else ('and', comparisons)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in AGGREGATE_FUNCTIONS:
+            if not grouped or aggregated or len(node.args) != 1 or node.keywords:
+                raise FilterDefinitionError(f"Invalid use of {node.func.id}")
+            return node.func.id, _compile(node.args[0], stack, True)
+        raise FilterDefinitionError(f"Invalid expression: {ast.dump(node)}")
+
+    return _compile(_parse(text), (), False)
+
+
+def _parse(text):
+    try:
+        return ast.parse(str(text).strip(), mode='eval')
+    except SyntaxError as err:
+        raise FilterDefinitionError(f"Invalid expression: {text}") from err
+
+
+def sub_expressions(tree):
+    """
+    :param tree: compiled expression
+    :return: generator of the tree and all of its sub-expressions
+    """
+    yield tree
+    for item in tree[1:]:
+        if isinstance(item, tuple) and item and isinstance(item[0], tuple):
+            for child in item:
+                yield from sub_expressions(child)
+        elif isinstance(item, tuple):
+            yield from sub_expressions(item)
+
+
+class CompiledFilter:
+    """
+    A filter definition which its expressions are compiled. Definition keys:
+        where: list of predicates which all should be true
+        columns: dict of name and expression of the filter's own derived columns
+        group_by: name of column which namads are grouped by, columns should be aggregated with sum(...)
+        order_by: expression which rows are sorted by in ascending order, Ex: '-saraneh'
+        limit: count of returned rows
+        values: list of expressions of returned values
+        converters: list of names of CONVERTERS for returned values
+        function: name of a registered python function which returns rows, instead of expressions
+    """
+
+    def __init__(self, code, definition, functions=None):
+        self.code = code
+        self.function = None
+        if definition.get('function'):
+            try:
+                self.function = (functions or {})[definition['function']]
+            except KeyError:
+                raise FilterDefinitionError(f"Unknown function: {definition['function']}")
+
+        self.group_by = definition.get('group_by')
+        if self.group_by is not None and self.group_by not in FRAME_COLUMNS:
+            raise FilterDefinitionError(f"Unknown column: {self.group_by}")
+        compile_kwargs = {
+            'columns': definition.get('columns'),
+            'grouped': self.group_by is not None,
+            'group_by': self.group_by,
+        }
+        self.where = tuple(compile_expression(p, **compile_kwargs) for p in definition.get('where', ()))
+        self.order_by = compile_expression(definition['order_by'], **compile_kwargs) \
+            if definition.get('order_by') else None
+        self.limit = definition.get('limit')
+        self.values = tuple(compile_expression(v, **compile_kwargs) for v in definition.get('values', ()))
+        if not self.function and not self.values:
+            raise FilterDefinitionError("Filter should have values or function")
+
+        converters = definition.get('converters') or ()
+        if self.values and converters and len(converters) != len(self.values):
+            raise FilterDefinitionError("Count of converters should be equal to count of values")
+        try:
+            self.converters = tuple(CONVERTERS[c] for c in converters)
+        except KeyError as err:
+            raise FilterDefinitionError(f"Unknown converter: {err.args[0]}")
+
+    def expressions(self):
+        return (*self.where, *((self.order_by,) if self.order_by else ()), *self.values)
+
+    def convert(self, rows):
+        if not self.converters:
+            return list(rows)
+        return [tuple(c(v) for c, v in zip(self.converters, row)) for row in rows]
+
+    def evaluate(self, frame, evaluator):
+        """
+        :param frame: FilterFrame object
+        :param evaluator: Evaluator of the cycle which shares computed expressions between filters
+        :return: list of converted rows
+        """
+        if self.function:
+            return self.convert(self.function(frame))
+
+        grouping = evaluator.grouping(self.group_by) if self.group_by else None
+        size = len(grouping[1]) if grouping else len(frame)
+        mask = np.ones(size, dtype=bool)
+        for predicate in self.where:
+            mask &= evaluator.evaluate(predicate, grouping)
+        indexes = np.flatnonzero(mask)
+        if self.order_by is not None:
+            keys = np.broadcast_to(evaluator.evaluate(self.order_by, grouping), (size,))
+            indexes = indexes[np.argsort(keys[indexes], kind='stable')]
+        if self.limit:
+            indexes = indexes[:self.limit]
+        columns = [np.broadcast_to(evaluator.evaluate(v, grouping), (size,))[indexes].tolist() for v in self.values]
+        return self.convert(zip(*columns))
+
+
+class Evaluator:
+    """
+    Evaluates compiled expressions over a frame, result of each expression is kept for the cycle,
+    so expressions which are shared between filters are computed once.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.results = {}
+        self._groupings = {}
+
+    def grouping(self, column):
+        """
+        :param column: name of column which namads are grouped by
+        :return: tuple of column, group keys and group index of each namad
+        """
+        if column not in self._groupings:
+            self._groupings[column] = (column, *np.unique(self.frame[column], return_inverse=True))
+        return self._groupings[column]
+
+    def evaluate(self, tree, grouping=None):
+        key = (grouping[0] if grouping else None, tree)
+        if key not in self.results:
+            self.results[key] = self._evaluate(tree, grouping)
+        return self.results[key]
+
+    def _evaluate(self, tree, grouping):
+        kind = tree[0]
+        if kind == 'const':
+            return tree[1]
+        if kind == 'col':
+            return self.frame[tree[1]]
+        if kind == 'group':
+            return grouping[1]
+        if kind == 'sum':
+            values = np.broadcast_to(self.evaluate(tree[1]), (len(self.frame),))
+            sums = np.zeros(len(grouping[1]), dtype=values.dtype)
+            np.add.at(sums, grouping[2], values)
+            return sums
+        if kind == 'bin':
+            return BINARY_OPERATORS[tree[1]](self.evaluate(tree[2], grouping), self.evaluate(tree[3], grouping))
+        if kind == 'cmp':
+            with np.errstate(invalid='ignore'):
+                return COMPARE_OPERATORS[tree[1]](self.evaluate(tree[2], grouping), self.evaluate(tree[3], grouping))
+        if kind == 'neg':
+            return np.negative(self.evaluate(tree[1], grouping))
+        if kind == 'not':
+            return np.logical_not(self.evaluate(tree[1], grouping))
+        if kind in ('and', 'or'):
+            size = len(grouping[1]) if grouping else len(self.frame)
+            reduce = np.logical_and.reduce if kind == 'and' else np.logical_or.reduce
+            return reduce([np.broadcast_to(self.evaluate(t, grouping), (size,)) for t in tree[1]])
+        raise FilterDefinitionError(f"Invalid expression: {tree}")
+
+
+class FilterPlan:
+    """
+    Compiled filters of a cycle. Sub-expressions which are used by more than one filter are found
+    by comparing compiled trees, they are computed once per cycle by the shared `Evaluator`.
+    """
+
+    def __init__(self, definitions, functions=None):
+        """
+        :param definitions: dict of filter code and its definition
+        :param functions: dict of name and python function of filters which are not expressions
+        """
+        self.filters = {}
+        self.errors = {}
+        for code, definition in definitions.items():
+            try:
+                self.filters[code] = CompiledFilter(code, definition, functions)
+            except FilterDefinitionError as err:
+                self.errors[code] = str(err)
+
+        usages = Counter(
+            e for f in self.filters.values()
+            for e in {e for tree in f.expressions() for e in sub_expressions(tree)}
+        )
+        self.shared = {e for e, count in usages.items() if count > 1 and e[0] not in ('const', 'col')}
+
+    def evaluate(self, frame):
+        """
+        :param frame: FilterFrame object
+        :return: dict of filter code and its converted rows
+        """
+        evaluator = Evaluator(frame)
+        return {code: f.evaluate(frame, evaluator) for code, f in self.filters.items()}
@@ -1,47 +1,40 @@
+import hashlib
 import logging
+from datetime import datetime
 
-from celery.schedules import crontab
-from celery.task import periodic_task
+from celery import shared_task
 from channels.layers import get_channel_layer
 
-from django.db.models import Sum, Count, F, ExpressionWrapper, FloatField, Max, BigIntegerField, Min
-from django.db.models.functions import Cast
+import numpy as np
 from django.core.cache import cache
 from django.utils import timezone
 
 from conf import settings
-from apps.tsetmc.models import NamadStat, NamadHistory
+from apps.tsetmc.ticks import last_stat_ticks
+from utils.utils import redis_connection, redis_key
 from asgiref.sync import async_to_sync
 
+from .definitions import FILTER_DEFINITIONS
+from .engine import FilterFrame
+from .incremental import incremental_filters
+from .planner import FilterPlan
 from .models import SignalFilter
 
 logger = logging.getLogger(__name__)
 MONEY_THRESHOLD = 1e2
+LAST_TWO_STATS_FIELDS = (
+    'created_time', 'pl', 'plp', 'pc', 'pcp', 'buy_i_volume', 'buy_counti', 'sell_i_volume', 'sell_counti'
+)
 
-DATA_CONVERTER = {
-    'saf_kharid': lambda x: (x[0], f"{x[1]:,}", x[2], f"{x[3]:,}"),
-    'saf_foroush': lambda x: (x[0], f"{x[1]:,}", x[2], f"{x[3]:,}"),
-    'hajm_mashkouk': lambda x: (x[0], f"{x[1]:,}", x[2], f"{round(x[3] / 1e6, 2):,} M", f"{round(x[4], 2):,}"),
-    'foroush_bishtar': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e6, 2):,} M", f"{round(x[3] / 1e6, 2):,} M", round(x[4], 2)),
-    'foroush_kamtar': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e6, 2):,} M", f"{round(x[3] / 1e6, 2):,} M", round(x[4], 2)),
-    'cbc_haqiqi': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e6, 2)} M", f"{round(x[3] / 1e6, 2)} M"),
-    'cbc_hoqouqi': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e6, 2)} M", f"{round(x[3] / 1e6, 2)} M"),
-    'taqaza_bartar': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e9):,} B", f"{x[3]:,}"),
-    'arzeh_bartar': lambda x: (x[0], f"{x[1]:,}", f"{round(x[2] / 1e9):,} B", f"{x[3]:,}"),
-    'kharid_haqiqi': lambda x: (x[0], f"{x[1]:,}", x[2], f"{round(x[3] / 1e6, 2):,} M", f"{x[4]:,}", round(x[5], 2)),
-    'foroush_haqiqi': lambda x: (x[0], f"{x[1]:,}", x[2], f"{round(x[3] / 1e6, 2):,} M", f"{x[4]:,}", round(x[5], 2)),
-    'sharpi': lambda x: (x[0], f"{x[1]:,}", x[2], f"{x[3]:,}"),
-    'range_mosbat': lambda x: (x[0], f"{x[1]:,}", x[2], f"{x[3]:,}", x[4], x[5].strftime("%H:%M:%S")),
-    'por_taqaza': lambda x: (x[0], round(x[1], 2), f"{round(x[2] / 1e9, 2):,} B"),
-    'shekar_navasani': lambda x: (x[0], f"{x[1]:,}", x[2], f"{round(x[3], 2):,}", f"{round(x[4], 2):,}", f"{round(x[5] / 1e9, 2):,} B"),
-    'kharid_forosh_mashkouk': lambda x: (
-        x[0].strftime("%H:%M:%S"), x[1], x[2], f"{round(x[3] / 1e9, 2):,} B", f"{round(x[4] / 1e9, 2):,} B", f"{round(x[5] / 1e9, 2):,} B",
-        f"{round(x[6], 2):,}", f"{x[7]:,}"),
-    'tavajoh_haqiqi': lambda x: (x[0], f"{x[1]:,}", x[2], f"{round(x[3], 2):,}", f"{round(x[4] / 1e9, 2):,} B", f"{round(x[5], 2):,}")
-}
+# Result of saf_kharid filter is returned by this name
+RESULT_NAMES = {'saf_kharid': 'saf_karid'}
+# Digest of the last posted rows of each filter is kept for this many seconds
+RESULT_DIGEST_TIMEOUT = 60 * 60 * 12
+TRIGGERED_KEY = redis_key('filters', 'triggered')
+PENDING_KEY = redis_key('filters', 'pending')
 
 
-def post_data(filter_code, signal_data):
+def post_data(filter_code, signal_data, signal_filter=None):
     # Empty cache on new day signal
     _last_touch = cache.get_or_set(f'{filter_code}_last_touched', timezone.now())
     if _last_touch.date() != timezone.now().date():
@@ -55,13 +48,15 @@ def post_data(filter_code, signal_data):
         )
         return 0
 
-    try:
-        _filter = SignalFilter.objects.select_related('category').get(filter_code=filter_code, is_enable=True)
-    except SignalFilter.DoesNotExist:
-        logger.warning(
-            f"[Filter Code not found]-[filter_code: {filter_code}]"
-        )
-        return 0
+    _filter = signal_filter
+    if _filter is None:
+        try:
+            _filter = SignalFilter.objects.select_related('category').get(filter_code=filter_code, is_enable=True)
+        except SignalFilter.DoesNotExist:
+            logger.warning(
+                f"[Filter Code not found]-[filter_code: {filter_code}]"
+            )
+            return 0
 
     if filter_code == 'kharid_forosh_mashkouk':
         _prev_signal_data = cache.get(filter_code, [])
@@ -93,472 +88,188 @@ def post_data(filter_code, signal_data):
     return len(signal_data)
 
 
-def process_data(func):
-    def wrapper(*args, **kwargs):
-        kwargs['last_stat'] = NamadStat.objects.values('namad__id').annotate(max_id=Max('id')).values_list('max_id', flat=True)
-        return post_data(func.__name__, list(map(DATA_CONVERTER[func.__name__], func(*args, **kwargs))))
-
-    return wrapper
-
-
-@periodic_task(run_every=crontab(**settings.INSERT_SECTIONS_CRONTAB))
-def call_filters():
+def last_two_stats(frame, since=None):
+    """
+    This function will find the last two stats of namads which have at least two stats, they are read
+    from NamadStat with one window query.
+    :param frame: FilterFrame object, names of namads are read from it
+    :param since: datetime, only namads which have at least two stats after it are used
+    :return: tuple of namad names and two dicts of stat field and array of latest and previous values
+    """
+    namad_ids, ticks = last_stat_ticks(LAST_TWO_STATS_FIELDS, since=since.timestamp() if since else None)
+    names = dict(zip(frame['namad_id'].tolist(), frame['name'].tolist()))
+    latest_stats, previous_stats = ({field: values[:, i] for field, values in ticks.items()} for i in (0, 1))
+    return [names.get(namad_id) for namad_id in namad_ids], latest_stats, previous_stats
+
+
+def filter_definitions(signal_filters):
+    """
+    :param signal_filters: dict of filter code and its SignalFilter object
+    :return: dict of filter code and its definition, definition of SignalFilter replaces the built-in one
+    """
     return {
-        'saf_karid': saf_kharid(),
-        'saf_foroush': saf_foroush(),
-        'hajm_mashkouk': hajm_mashkouk(),
-        'foroush_bishtar': foroush_bishtar(),
-        'foroush_kamtar': foroush_kamtar(),
-        'cbc_haqiqi': cbc_haqiqi(),
-        'cbc_hoqouqi': cbc_hoqouqi(),
-        'taqaza_bartar': taqaza_bartar(),
-        'arzeh_bartar': arzeh_bartar(),
-        'kharid_haqiqi': kharid_haqiqi(),
-        'foroush_haqiqi': foroush_haqiqi(),
-        'sharpi': sharpi(),
-        'range_mosbat': range_mosbat(),
-        'por_taqaza': por_taqaza(),
-        'kharid_forosh_mashkouk': kharid_forosh_mashkouk(),
-        'shekar_navasani': shekar_navasani(),
-        'tavajoh_haqiqi': tavajoh_haqiqi(),
+        **FILTER_DEFINITIONS,
+        **{code: f.definition for code, f in signal_filters.items() if f.definition}
     }
 
 
-@process_data
-def saf_kharid(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        pl__lt=F('tmax'),
-        pl__gt=ExpressionWrapper(0.2 * F('py') + 0.8 * F('tmax'), output_field=FloatField())
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'pc'
-    )
-
-
-@process_data
-def saf_foroush(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        pl__gt=F('tmin'),
-        pl__lt=ExpressionWrapper(0.2 * F('py') + 0.8 * F('tmin'), output_field=FloatField())
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'pc'
-    )
-
+def result_digest(rows):
+    """
+    :param rows: converted rows of a filter
+    :return: digest of rows which is compared with the digest of the last posted rows of the filter
+    """
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
 
-@process_data
-def hajm_mashkouk(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        total_transaction_average__gt=0
-    ).annotate(
-        tvol_tta=Cast('tvol', output_field=FloatField()) / Cast('total_transaction_average', output_field=FloatField())
-    ).order_by(
-        '-tvol_tta'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'tvol',
-        'tvol_tta'
-    )[:15]
-
-
-@process_data
-def foroush_bishtar(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        buy_counti__gt=0,
-        buy_i_volume__gt=0,
-        sell_counti__gt=0,
-        sell_i_volume__gt=0,
-    ).annotate(
-        kharid_avg=Cast('buy_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('buy_counti',
-                                                                                                                  output_field=FloatField()),
-        foroush_avg=Cast('sell_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('sell_counti',
-                                                                                                                    output_field=FloatField())
-    ).filter(
-        foroush_avg__gt=0,
-    ).annotate(
-        saraneh=Cast('kharid_avg', output_field=FloatField()) / Cast('foroush_avg', output_field=FloatField())
-    ).order_by(
-        '-saraneh'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'kharid_avg',
-        'foroush_avg',
-        'saraneh'
-    )[:15]
-
-
-@process_data
-def foroush_kamtar(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        buy_counti__gt=0,
-        buy_i_volume__gt=0,
-        sell_counti__gt=0,
-        sell_i_volume__gt=0,
-    ).annotate(
-        kharid_avg=Cast('buy_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('buy_counti',
-                                                                                                                  output_field=FloatField()),
-        foroush_avg=Cast('sell_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('sell_counti',
-                                                                                                                    output_field=FloatField()),
-    ).filter(
-        foroush_avg__gt=0,
-    ).annotate(
-        saraneh=Cast('kharid_avg', output_field=FloatField()) / Cast('foroush_avg', output_field=FloatField())
-    ).order_by(
-        'saraneh'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'kharid_avg',
-        'foroush_avg',
-        'saraneh'
-    )[:15]
-
-
-@process_data
-def cbc_haqiqi(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        # total_transaction_average__gt=0,
-        tvol__gt=0
-    ).annotate(
-        # e=Cast('tvol', output_field=FloatField()) / Cast('total_transaction_average', output_field=FloatField()),
-        j=Cast('buy_n_volume', output_field=FloatField()) / Cast('tvol', output_field=FloatField()),
-        k=Cast('sell_i_volume', output_field=FloatField()) / Cast('tvol', output_field=FloatField())
-    ).filter(
-        # e__gt=1,
-        j__gt=0.5,
-        k__gt=0.7
-    ).values_list(
-        'namad__name',
-        'pl',
-        'sell_i_volume',
-        'buy_n_volume'
-    )
-
-
-@process_data
-def cbc_hoqouqi(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        # total_transaction_average__gt=0,
-        tvol__gt=0
-    ).annotate(
-        # e=Cast('tvol', output_field=FloatField()) / Cast('total_transaction_average', output_field=FloatField()),
-        j=Cast('sell_n_volume', output_field=FloatField()) / Cast('tvol', output_field=FloatField()),
-        k=Cast('buy_i_volume', output_field=FloatField()) / Cast('tvol', output_field=FloatField())
-    ).filter(
-        # e__gt=1,
-        j__gt=0.5,
-        k__gt=0.7
-    ).values_list(
-        'namad__name',
-        'pl',
-        'buy_i_volume',
-        'sell_n_volume'
-    )
 
-
-@process_data
-def taqaza_bartar(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        pl=F('tmax')
-    ).annotate(
-        top_demand_q=Cast(F('pl'), output_field=BigIntegerField()) * Cast(F('qd1'), output_field=BigIntegerField())
-    ).order_by(
-        '-top_demand_q'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'top_demand_q',
-        'pc'
-    )[:15]
-
-
-@process_data
-def arzeh_bartar(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        pl=F('tmin')
-    ).annotate(
-        top_supply_q=Cast(F('pl'), output_field=BigIntegerField()) * Cast(F('qo1'), output_field=BigIntegerField())
-    ).order_by(
-        '-top_supply_q'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'top_supply_q',
-        'pc'
-    )[:15]
-
-
-@process_data
-def kharid_haqiqi(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        buy_counti__gt=0,
-        sell_counti__gt=0
-    ).annotate(
-        kharid_avg=Cast('buy_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('buy_counti',
-                                                                                                                  output_field=FloatField()),
-        foroush_avg=Cast('sell_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('sell_counti',
-                                                                                                                    output_field=FloatField())
-    ).annotate(
-        saraneh=Cast('kharid_avg', output_field=FloatField()) / Cast('foroush_avg', output_field=FloatField())
-    ).order_by(
-        '-kharid_avg'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'kharid_avg',
-        'buy_counti',
-        'saraneh'
-    )[:15]
-
-
-@process_data
-def foroush_haqiqi(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        buy_counti__gt=0,
-        sell_counti__gt=0,
-        sell_i_volume__gt=0
-    ).annotate(
-        kharid_avg=Cast('buy_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('buy_counti',
-                                                                                                                  output_field=FloatField()),
-        foroush_avg=Cast('sell_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('sell_counti',
-                                                                                                                    output_field=FloatField())
-    ).annotate(
-        saraneh=Cast('foroush_avg', output_field=FloatField()) / Cast('kharid_avg', output_field=FloatField())
-    ).order_by(
-        '-foroush_avg'
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'foroush_avg',
-        'sell_counti',
-        'saraneh'
-    )[:15]
-
-
-@process_data
-def sharpi(*args, **kwargs):
-    history_last_records = NamadHistory.objects.values('namad_id').annotate(max_id=Max('id')).values_list('max_id', flat=True)
-    yesterday_stats = NamadHistory.objects.filter(
-        pk__in=history_last_records,
-        pl=F('tmax')
-    ).values_list('namad_id', flat=True)
-
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        namad_id__in=yesterday_stats,
-        pmax=F('tmax'),
-        pl__lt=F('pmax')
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'pc'
-    )
+def changed_results(results):
+    """
+    This function will compare rows of filters with their last posted rows in redis, so the last posted
+    rows of any worker are compared, not the last rows of this process.
+    :param results: dict of filter code and its converted rows
+    :return: dict of filter code and digest of its rows for filters which their rows are changed
+    """
+    digests = {code: result_digest(rows) for code, rows in results.items()}
+    posted = redis_connection.mget([redis_key('filters', 'posted', code) for code in digests]) if digests else []
+    return {
+        code: digest for (code, digest), old in zip(digests.items(), posted)
+        if old is None or old.decode() != digest
+    }
 
 
-@process_data
-def range_mosbat(*args, **kwargs):
-    namad_ids = NamadStat.objects.filter(
-        created_time__gte=timezone.now() - timezone.timedelta(minutes=5)
-    ).values('namad').annotate(stat_count=Count('*')).filter(stat_count__gte=2).values_list('namad_id', flat=True)
-
-    range_mosbat_list = []
-    for namad_id in namad_ids:
-        namad_stats = NamadStat.objects.select_related('namad').filter(namad_id=namad_id).order_by('-pk')[:2]
-        second_stat = namad_stats[0]
-        first_stat = namad_stats[1]
-
-        if first_stat.plp - second_stat.plp > 1.5:
-            range_mosbat_list.append((
-                first_stat.namad.name,
-                first_stat.pl,
-                first_stat.plp,
-                first_stat.pc,
-                first_stat.pcp,
-                first_stat.created_time
-            ))
-
-    return range_mosbat_list
-
-
-@process_data
-def por_taqaza(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-    ).values(
-        'namad__group_name'
-    ).annotate(
-        sum_buy_i_volume=Sum('buy_i_volume'),
-        sum_buy_counti=Sum('buy_counti'),
-        sum_sell_i_volume=Sum('sell_i_volume'),
-        sum_sell_counti=Sum('sell_counti'),
-        sum_entered_money=Sum(Cast('pc', output_field=BigIntegerField()) * (F('buy_i_volume') - F('sell_i_volume')))
-    ).filter(
-        sum_buy_i_volume__gt=0,
-        sum_buy_counti__gt=0,
-        sum_sell_i_volume__gt=0,
-        sum_sell_counti__gt=0
-    ).annotate(
-        saraneh_foroush=Cast('sum_sell_i_volume', output_field=FloatField()) / Cast('sum_sell_counti', output_field=FloatField()),
-        saraneh_kharid=Cast('sum_buy_i_volume', output_field=FloatField()) / Cast('sum_buy_counti', output_field=FloatField()),
-    ).annotate(
-        saraneh=Cast('saraneh_kharid', output_field=FloatField()) / Cast('saraneh_foroush', output_field=FloatField())
-    ).order_by(
-        '-saraneh'
-    ).values_list(
-        'namad__group_name',
-        'saraneh',
-        'sum_entered_money'
-    )[:15]
-
-
-@process_data
-def shekar_navasani(*args, **kwargs):
-    return NamadStat.objects.filter(
-        id__in=kwargs['last_stat'],
-        total_transaction_average__gt=0,
-        buy_counti__gt=30,
-        sell_counti__gt=0
-    ).annotate(
-        tvol_tta=Cast('tvol', output_field=FloatField()) / Cast('total_transaction_average', output_field=FloatField()),
-        kharid_avg=Cast('buy_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('buy_counti', output_field=FloatField()),
-        foroush_avg=Cast('sell_i_volume', output_field=FloatField()) * Cast('pc', output_field=FloatField()) / Cast('sell_counti', output_field=FloatField()),
-    ).filter(
-        foroush_avg__gt=0
-    ).annotate(
-        saraneh=F('kharid_avg') / F('foroush_avg'),
-        entered_money=Cast('pc', output_field=BigIntegerField()) * (F('buy_i_volume') - F('sell_i_volume'))
-    ).filter(
-        saraneh__gt=2,
-        kharid_avg__gt=MONEY_THRESHOLD * 1e6,
-        tvol_tta__gt=1
-    ).values_list(
-        'namad__name',
-        'pl',
-        'plp',
-        'tvol_tta',
-        'saraneh',
-        'entered_money'
+def mark_cycle_started():
+    """
+    This function will mark the start of a cycle of filters, next cycles are not started immediately until
+    FILTERS_MIN_INTERVAL seconds after it and a pending cycle can be queued again.
+    """
+    pipeline = redis_connection.pipeline()
+    pipeline.set(TRIGGERED_KEY, 1, ex=settings.FILTERS_MIN_INTERVAL)
+    pipeline.delete(PENDING_KEY)
+    pipeline.execute()
+
+
+def trigger_filters(changed_count):
+    """
+    This function will queue a cycle of filters when new sections data is written, Ex: at the end of a sweep.
+    Cycles are not started more than once per FILTERS_MIN_INTERVAL seconds, a trigger in this interval queues
+    one cycle for its end so the last data is not left unfiltered.
+    :param changed_count: count of namads which their sections are changed
+    :return: True if a cycle is queued
+    """
+    if not changed_count:
+        return False
+
+    interval = settings.FILTERS_MIN_INTERVAL
+    if redis_connection.set(TRIGGERED_KEY, 1, ex=interval, nx=True):
+        call_filters.delay()
+    elif redis_connection.set(PENDING_KEY, 1, ex=interval, nx=True):
+        call_filters.apply_async(countdown=max(redis_connection.ttl(TRIGGERED_KEY), 0))
+    else:
+        return False
+
+    logger.debug(f"[Filters triggered]-[Changed namads count: {changed_count}]")
+    return True
+
+
+@shared_task
+def call_filters():
+    """
+    This function will evaluate enabled filters and post their signals. Latest stats of all namads are read
+    once and sub-expressions which are shared between filters are computed once. In incremental mode only
+    rows of namads which are changed since the last cycle are evaluated, see `IncrementalFilters`.
+    :return: dict of filter code and count of its posted signals, 0 for filters which are not posted
+    """
+    # Pending cycles which are queued by triggers start here too, so the interval is measured from this start
+    mark_cycle_started()
+    signal_filters = {
+        f.filter_code: f for f in SignalFilter.objects.select_related('category').filter(is_enable=True)
+    }
+    definitions = filter_definitions(signal_filters)
+    plan = FilterPlan(
+        {code: d for code, d in definitions.items() if code in signal_filters},
+        functions=FILTER_FUNCTIONS
     )
-
-
-@process_data
-def tavajoh_haqiqi(*args, **kwargs):
-    min_max = {ns['namad_id']: ns for ns in NamadHistory.objects.filter(
-        created_time__gt=timezone.now() - timezone.timedelta(days=30)
-    ).values(
-        'namad_id'
-    ).annotate(
-        max=Max('pl'),
-        min=Min('pl')
-    ).filter(
-        max__gt=F('min')
-    ).values(
-        'namad_id',
-        'max',
-        'min'
-    )}
-
-    namad_stats = NamadStat.objects.select_related('namad').filter(
-        id__in=kwargs['last_stat'],
-        buy_counti__gt=0,
-        sell_counti__gt=0,
-        total_transaction_average__gt=0,
-        tvol__gt=0
-    ).annotate(
-        saraneh_kharid=Cast('buy_i_volume', output_field=FloatField()) / Cast('buy_counti', output_field=FloatField()),
-        saraneh_foroush=Cast('sell_i_volume', output_field=FloatField()) / Cast('sell_counti', output_field=FloatField()),
-        saraneh=F('saraneh_kharid') / F('saraneh_foroush'),
-        # monthly_distance=(Cast('pl', output_field=FloatField()) - namad['pl_min']) * 1e2 / (namad['pl_max'] - namad['pl_min']),
-        j=Cast('sell_n_volume', output_field=FloatField()) / Cast('tvol', output_field=FloatField()),
-        entered_money=Cast('pc', output_field=BigIntegerField()) * (F('buy_i_volume') - F('sell_i_volume')),
-        tvol_tta=Cast('tvol', output_field=FloatField()) / Cast('total_transaction_average', output_field=FloatField()),
-    ).filter(
-        saraneh__gt=10,
-        j__lt=0.2,
-        # monthly_distance__lt=20
-    ).values_list(
-        'namad_id',
-        'namad__name',
-        'pl',
-        'plp',
-        'saraneh',
-        'entered_money',
-        'tvol_tta'
+    for code, error in plan.errors.items():
+        logger.error(f"[Filter definition is not valid]-[filter_code: {code}]-[error: {error}]")
+    logger.debug(f"[Filter plan is made]-[Filters count: {len(plan.filters)}]-[Shared expressions: {len(plan.shared)}]")
+
+    if settings.FILTERS_INCREMENTAL:
+        # Only rows of changed namads are evaluated and only filters which their rows are changed are posted
+        results = incremental_filters.evaluate(plan, definitions)
+        changed = changed_results(results)
+        logger.debug(f"[Filters are evaluated incrementally]-[Changed filters: {len(changed)}]")
+    else:
+        results = plan.evaluate(FilterFrame.load())
+        changed = {}
+
+    counts = {
+        RESULT_NAMES.get(code, code): post_data(code, results[code], signal_filters[code])
+        if code in results and (code in changed or not settings.FILTERS_INCREMENTAL) else 0
+        for code in definitions
+    }
+    if changed:
+        # Digests are written after posting, rows which are failed to be posted are posted on the next cycle
+        pipeline = redis_connection.pipeline(transaction=False)
+        for code, digest in changed.items():
+            pipeline.set(redis_key('filters', 'posted', code), digest, ex=RESULT_DIGEST_TIMEOUT)
+        pipeline.execute()
+    return counts
+
+
+def range_mosbat(frame):
+    names, second_stats, first_stats = last_two_stats(frame, since=timezone.now() - timezone.timedelta(minutes=5))
+    indexes = np.flatnonzero(first_stats['plp'] - second_stats['plp'] > 1.5)
+    return list(zip(
+        [names[i] for i in indexes],
+        first_stats['pl'][indexes].tolist(),
+        first_stats['plp'][indexes].tolist(),
+        first_stats['pc'][indexes].tolist(),
+        first_stats['pcp'][indexes].tolist(),
+        map(datetime.fromtimestamp, first_stats['created_time'][indexes].tolist())
+    ))
+
+
+def kharid_forosh_mashkouk(frame):
+    names, latest_stats, second_latest_stats = last_two_stats(frame)
+    pl, pc = latest_stats['pl'], latest_stats['pc']
+    kharid_lahze = (latest_stats['buy_i_volume'] - second_latest_stats['buy_i_volume']) * pl
+    buyers_count = latest_stats['buy_counti'] - second_latest_stats['buy_counti']
+    foroush_lahze = (latest_stats['sell_i_volume'] - second_latest_stats['sell_i_volume']) * pl
+    sellers_count = latest_stats['sell_counti'] - second_latest_stats['sell_counti']
+
+    kharid_lahze_avg = FilterFrame.divide(kharid_lahze, buyers_count)
+    foroush_lahze_avg = FilterFrame.divide(foroush_lahze, sellers_count)
+    saraneh_kharid = FilterFrame.divide(latest_stats['buy_i_volume'] * pc, latest_stats['buy_counti'])
+    saraneh_foroush = FilterFrame.divide(latest_stats['sell_i_volume'] * pc, latest_stats['sell_counti'])
+    saraneh = FilterFrame.divide(saraneh_kharid, saraneh_foroush)
+    # Namads which any of these divisions is a division by zero are skipped
+    valid = (
+        (buyers_count != 0) & (sellers_count != 0)
+        & (latest_stats['buy_counti'] != 0) & (latest_stats['sell_counti'] != 0) & (saraneh_foroush != 0)
     )
 
-    return [ns[1:] for ns in namad_stats if min_max.get(ns[0]) and ((ns[2] - min_max[ns[0]]['min']) * 1e2 / (min_max[ns[0]]['max'] - min_max[ns[0]]['min'])) < 20]
-
-
-@process_data
-def kharid_forosh_mashkouk(*args, **kwargs):
-    namad_ids = NamadStat.objects.values('namad').annotate(stat_count=Count('*')).filter(stat_count__gte=2).values_list('namad_id', flat=True)
-
     kharid_foroush_list = []
-    for namad_id in namad_ids:
-        namad_stats = NamadStat.objects.select_related('namad').filter(namad_id=namad_id).order_by('-pk')[:2]
-        latest_stat = namad_stats[0]
-        second_latest_stat = namad_stats[1]
+    for title, lahze_avg in (('خرید مشکوک', kharid_lahze_avg), ('فروش مشکوک', foroush_lahze_avg)):
+        indexes = np.flatnonzero(valid & (lahze_avg / 1e7 > MONEY_THRESHOLD))
+        kharid_foroush_list.extend(zip(
+            map(datetime.fromtimestamp, latest_stats['created_time'][indexes].tolist()),
+            [names[i] for i in indexes],
+            [title] * len(indexes),
+            lahze_avg[indexes].tolist(),
+            saraneh_kharid[indexes].tolist(),
+            saraneh_foroush[indexes].tolist(),
+            saraneh[indexes].tolist(),
+            pl[indexes].tolist()
+        ))
+
+    return kharid_foroush_list
 
-        kharid_lahze = (latest_stat.buy_i_volume - second_latest_stat.buy_i_volume) * latest_stat.pl
-        buyers_count = latest_stat.buy_counti - second_latest_stat.buy_counti
 
-        foroush_lahze = (latest_stat.sell_i_volume - second_latest_stat.sell_i_volume) * latest_stat.pl
-        sellers_count = latest_stat.sell_counti - second_latest_stat.sell_counti
-        try:
-            kharid_lahze_avg = kharid_lahze / buyers_count
-            foroush_lahze_avg = foroush_lahze / sellers_count
-            saraneh_kharid = latest_stat.buy_i_volume * latest_stat.pc / latest_stat.buy_counti
-            saraneh_foroush = latest_stat.sell_i_volume * latest_stat.pc / latest_stat.sell_counti
-            saraneh = saraneh_kharid / saraneh_foroush
-        except ZeroDivisionError:
-            continue
-
-        if kharid_lahze_avg / 1e7 > MONEY_THRESHOLD:
-            kharid_foroush_list.append((
-                latest_stat.created_time,
-                latest_stat.namad.name,
-                'خرید مشکوک',
-                kharid_lahze_avg,
-                saraneh_kharid,
-                saraneh_foroush,
-                saraneh,
-                latest_stat.pl
-            ))
-
-        if foroush_lahze_avg / 1e7 > MONEY_THRESHOLD:
-            kharid_foroush_list.append((
-                latest_stat.created_time,
-                latest_stat.namad.name,
-                'فروش مشکوک',
-                foroush_lahze_avg,
-                saraneh_kharid,
-                saraneh_foroush,
-                saraneh,
-                latest_stat.pl
-            ))
+# Filters which are not expressions, they are referenced by name in filter definitions
+FILTER_FUNCTIONS = {
+    'range_mosbat': range_mosbat,
+    'kharid_forosh_mashkouk': kharid_forosh_mashkouk,
+}
 
-    return kharid_foroush_list
 
 # @shared_task
 # def hajm_emrouz():
@@ -0,0 +1,157 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.filters.definitions import FILTER_DEFINITIONS
+from apps.filters.engine import FilterFrame
+from apps.filters.incremental import IncrementalFilters
+from apps.filters.planner import FilterPlan
+from apps.tsetmc.snapshots import SNAPSHOT_DTYPE, LatestSnapshot
+
+UPDATED_COLUMNS = (
+    'pl', 'pc', 'tvol', 'qd1', 'qo1', 'buy_i_volume', 'sell_i_volume', 'buy_n_volume', 'sell_n_volume',
+    'buy_counti', 'sell_counti'
+)
+
+
+def random_snapshot(rng, size):
+    snapshot = np.zeros(size, dtype=SNAPSHOT_DTYPE)
+    snapshot['namad_id'] = [f'{i:04}' for i in range(size)]
+    snapshot['name'] = [f'namad{i}' for i in range(size)]
+    snapshot['group_name'] = [f'group{i % 7}' for i in range(size)]
+    snapshot['py'] = rng.integers(1000, 50000, size)
+    snapshot['tmax'] = snapshot['py'] * 105 // 100
+    snapshot['tmin'] = snapshot['py'] * 95 // 100
+    snapshot['pl'] = rng.integers(snapshot['tmin'], snapshot['tmax'] + 1)
+    snapshot['pc'] = rng.integers(snapshot['tmin'], snapshot['tmax'] + 1)
+    snapshot['pmax'] = np.maximum(snapshot['pl'], snapshot['pc'])
+    snapshot['plp'] = np.round((snapshot['pl'] - snapshot['py']) * 100 / snapshot['py'], 2)
+    for column in ('tvol', 'qd1', 'qo1', 'buy_i_volume', 'sell_i_volume', 'buy_n_volume', 'sell_n_volume'):
+        snapshot[column] = rng.integers(0, 10 ** 7, size)
+    snapshot['buy_counti'] = rng.integers(0, 500, size)
+    snapshot['sell_counti'] = rng.integers(0, 500, size)
+    snapshot['total_transaction_average'] = rng.integers(0, 10 ** 7, size)
+    return snapshot
+
+
+class IncrementalFiltersTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(1)
+        self.snapshot = random_snapshot(self.rng, 200)
+        self.history = {
+            'yesterday_at_tmax': self.rng.random(len(self.snapshot)) < 0.3,
+            'monthly_min': self.snapshot['tmin'] * 0.9,
+            'monthly_max': self.snapshot['tmax'] * 1.1,
+        }
+        self.store = LatestSnapshot(name='test:filters:snapshot')
+        self.addCleanup(self.store.clear)
+        self.store.clear()
+        self.store.replace(self.snapshot)
+        self.filters = IncrementalFilters(store=self.store)
+        self.definitions = {code: d for code, d in FILTER_DEFINITIONS.items() if not d.get('function')}
+        self.plan = FilterPlan(self.definitions)
+
+        # Frame is loaded from the store, only columns of histories are set instead of reading NamadHistory
+        load = FilterFrame.load
+        patcher = mock.patch.object(FilterFrame, 'load', side_effect=lambda store: self.with_history(load(store)))
+        self.load = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def with_history(self, frame):
+        for name, column in self.history.items():
+            frame._columns[name] = column[np.searchsorted(self.snapshot['namad_id'], frame['namad_id'])]
+        return frame
+
+    def frame(self, snapshot):
+        return self.with_history(FilterFrame(snapshot.copy()))
+
+    def write(self, rows):
+        positions = np.searchsorted(self.snapshot['namad_id'], rows['namad_id'])
+        known = positions < len(self.snapshot)
+        known[known] = self.snapshot['namad_id'][positions[known]] == rows['namad_id'][known]
+        self.snapshot[positions[known]] = rows[known]
+        self.store._rows = {row['namad_id']: row.tobytes() for row in rows}
+        self.store.flush()
+
+    def assert_evaluated(self, snapshot=None):
+        results = self.filters.evaluate(self.plan, self.definitions)
+        self.assertDictEqual(results, self.plan.evaluate(self.frame(self.snapshot if snapshot is None else snapshot)))
+        return results
+
+    def test_random_updates(self):
+        self.assert_evaluated()
+        for i in range(300):
+            indexes = self.rng.choice(len(self.snapshot), self.rng.integers(1, 6), replace=False)
+            rows = self.snapshot[indexes].copy()
+            for column in UPDATED_COLUMNS:
+                rows[column] = rows[column] * self.rng.uniform(0.3, 2.5, len(rows))
+            if i % 7 == 0:
+                rows['pl'] = rows['tmax']
+            if i % 11 == 0:
+                rows['buy_counti'] = 0
+            self.write(rows)
+            with self.subTest(update=i):
+                self.assert_evaluated()
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_row_drops_out_of_top(self):
+        results = self.assert_evaluated()
+        top_name = results['hajm_mashkouk'][0][0]
+
+        rows = self.snapshot[self.snapshot['name'] == top_name].copy()
+        rows['tvol'] = 0
+        self.write(rows)
+        results = self.assert_evaluated()
+
+        self.assertNotIn(top_name, [row[0] for row in results['hajm_mashkouk']])
+        self.assertEqual(len(results['hajm_mashkouk']), 15)
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_new_namad(self):
+        self.assert_evaluated()
+        rows = self.snapshot[:1].copy()
+        rows['namad_id'] = '9999'
+        rows['name'] = 'new'
+        self.write(rows)
+        self.snapshot = np.concatenate([self.snapshot, rows])
+        self.history = {name: np.r_[column, column[:1]] for name, column in self.history.items()}
+
+        self.assert_evaluated()
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_store_clear(self):
+        for i in range(3):
+            self.write(self.snapshot[i:i + 1].copy())
+        self.assert_evaluated()
+
+        # Rows of the last day are dropped by clearing the store, the frame has only rows which are written after it
+        self.store.clear()
+        self.write(self.snapshot[:1].copy())
+        self.assert_evaluated(self.snapshot[:1])
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_rows_written_before_load(self):
+        rows = self.snapshot[:3].copy()
+        rows['tvol'] = 0
+        self.write(rows)
+        # Rows which are in the loaded frame are not read again as changes
+        self.assert_evaluated()
+        self.assertEqual(self.filters.version, self.store.version())
+        self.assertEqual(self.store.changes(self.filters.version)[1], [])
+
+    @mock.patch('apps.tsetmc.snapshots.latest_stats_snapshot')
+    def test_empty_store(self, latest_stats_snapshot):
+        latest_stats_snapshot.return_value = self.snapshot.copy()
+        self.store.clear()
+
+        self.assert_evaluated()
+        latest_stats_snapshot.assert_called_once()
+        self.write(self.snapshot[:1].copy())
+        self.assert_evaluated()
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_unchanged_store(self):
+        first = self.assert_evaluated()
+        self.assertEqual(self.filters.evaluate(self.plan, self.definitions), first)
+        self.assertEqual(self.load.call_count, 1)
@@ -0,0 +1,111 @@
+import ast
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.filters.definitions import FILTER_DEFINITIONS
+from apps.filters.engine import FilterFrame
+from apps.filters.models import SignalFilter
+from apps.filters.planner import Evaluator, FilterDefinitionError, FilterPlan, compile_expression
+from apps.filters.tasks import filter_definitions
+from apps.tsetmc.snapshots import SNAPSHOT_DTYPE, LatestSnapshot
+
+
+def make_frame(**columns):
+    size = len(next(iter(columns.values())))
+    snapshot = np.zeros(size, dtype=SNAPSHOT_DTYPE)
+    snapshot['namad_id'] = [str(i) for i in range(size)]
+    for name, values in columns.items():
+        snapshot[name] = values
+    return FilterFrame(snapshot)
+
+
+class FilterFrameTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.store = LatestSnapshot(name='test:filters:frame')
+        self.addCleanup(self.store.clear)
+        self.store.clear()
+
+    def test_load_from_store(self):
+        self.store.replace(make_frame(pl=[30, 10, 20]).snapshot[[2, 0, 1]])
+
+        frame = FilterFrame.load(self.store)
+        self.assertListEqual(frame['namad_id'].tolist(), ['0', '1', '2'])
+        self.assertListEqual(frame['pl'].tolist(), [30, 10, 20])
+
+    @mock.patch('apps.tsetmc.snapshots.latest_stats_snapshot')
+    def test_load_from_empty_store(self, latest_stats_snapshot):
+        latest_stats_snapshot.return_value = make_frame(pl=[30, 10]).snapshot
+
+        self.assertListEqual(FilterFrame.load(self.store)['pl'].tolist(), [30, 10])
+        self.assertListEqual(FilterFrame.load(self.store)['pl'].tolist(), [30, 10])
+        # NamadStat is read once and the store is filled by it
+        latest_stats_snapshot.assert_called_once()
+        self.assertEqual(len(self.store.load()), 2)
+
+
+class CompileExpressionTestCase(SimpleTestCase):
+    def test_compile(self):
+        self.assertEqual(compile_expression('pl > 0'), ('cmp', ast.Gt, ('col', 'pl'), ('const', 0)))
+        # Derived columns are inlined, so equal sub-expressions have equal trees
+        self.assertEqual(
+            compile_expression('saraneh > 2')[2],
+            compile_expression('kharid_avg / foroush_avg')
+        )
+
+    def test_invalid_expressions(self):
+        for expression in (
+                'pl.real', '__import__("os")', 'abs(pl)', 'sum(pl)', 'unknown_column > 0',
+                'pl if pl else 0', '"pl" > 0', 'pl >', 'x > 0'
+        ):
+            with self.subTest(expression=expression), self.assertRaises(FilterDefinitionError):
+                compile_expression(expression, columns={'x': 'x + 1'})
+
+    def test_grouped_expressions(self):
+        self.assertEqual(
+            compile_expression('sum(pl) > 0', grouped=True, group_by='group_name')[2],
+            ('sum', ('col', 'pl'))
+        )
+        for expression in ('pl > 0', 'sum(sum(pl))', 'sum(pl, pc)'):
+            with self.subTest(expression=expression), self.assertRaises(FilterDefinitionError):
+                compile_expression(expression, grouped=True, group_by='group_name')
+
+
+class FilterPlanTestCase(SimpleTestCase):
+    definitions = {
+        'first': {'where': ['tvol > 0', 'pl / tvol > 0.5'], 'values': ['pl']},
+        'second': {'where': ['tvol > 0', 'pl / tvol > 0.5', 'pc > 0'], 'values': ['pc']},
+        'invalid': {'where': ['tvol >'], 'values': ['pl']},
+    }
+
+    def test_shared_expressions(self):
+        plan = FilterPlan(self.definitions)
+        self.assertSetEqual(set(plan.filters), {'first', 'second'})
+        self.assertIn('invalid', plan.errors)
+        self.assertIn(compile_expression('pl / tvol > 0.5'), plan.shared)
+
+        frame = make_frame(pl=[10, 1, 5], tvol=[10, 10, 0], pc=[1, 1, 0])
+        with mock.patch.object(Evaluator, '_evaluate', autospec=True, side_effect=Evaluator._evaluate) as evaluate:
+            results = plan.evaluate(frame)
+
+        self.assertDictEqual(results, {'first': [(10,)], 'second': [(1,)]})
+        trees = [call.args[1] for call in evaluate.call_args_list]
+        self.assertEqual(trees.count(compile_expression('pl / tvol')), 1)
+        self.assertEqual(trees.count(compile_expression('tvol > 0')), 1)
+
+
+class FilterDefinitionsTestCase(SimpleTestCase):
+    def test_signal_filter_definition(self):
+        definition = {'where': ['pl > 0'], 'values': ['name']}
+        definitions = filter_definitions({
+            'sharpi': SignalFilter(filter_code='sharpi', definition=definition),
+            'saf_kharid': SignalFilter(filter_code='saf_kharid'),
+        })
+
+        self.assertEqual(definitions['sharpi'], definition)
+        self.assertEqual(definitions['saf_kharid'], FILTER_DEFINITIONS['saf_kharid'])
+
+        frame = make_frame(name=['a', 'b'], pl=[0, 10], pmax=[10, 10], tmax=[10, 10])
+        results = FilterPlan({'sharpi': definitions['sharpi']}).evaluate(frame)
+        self.assertDictEqual(results, {'sharpi': [('b',)]})
@@ -1,9 +1,17 @@
+from unittest import mock
+
 from django.core import management
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.utils import timezone
 
-from apps.filters.tasks import call_filters
+from apps.filters.definitions import FILTER_DEFINITIONS
+from apps.filters.incremental import incremental_filters
+from apps.filters.tasks import (
+    PENDING_KEY, TRIGGERED_KEY, call_filters, changed_results, mark_cycle_started, result_digest, trigger_filters
+)
 from apps.tsetmc.models import NamadStat, NamadDailyStat, NamadHistory
+from apps.tsetmc.snapshots import latest_snapshot
+from utils.utils import redis_connection, redis_key
 
 
 class FilterTaskTestCase(TestCase):
@@ -14,6 +22,12 @@ class FilterTaskTestCase(TestCase):
         NamadDailyStat.objects.update(created_time=now)
         NamadStat.objects.update(created_time=now)
         NamadHistory.objects.update(created_time=now)
+        # Rows of filters are posted only if they are changed since the last posted rows
+        redis_connection.delete(*[redis_key('filters', 'posted', code) for code in FILTER_DEFINITIONS])
+        incremental_filters.reset()
+        # Frame is loaded from the latest snapshot store, it is filled by the stats of fixtures
+        latest_snapshot.clear()
+        self.addCleanup(latest_snapshot.clear)
 
     def test_call_filters(self):
         expected_data = {
@@ -26,3 +40,44 @@ class FilterTaskTestCase(TestCase):
         }
         result_data = call_filters()
         self.assertDictEqual(result_data, expected_data)
+
+
+class ChangedResultsTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.key = redis_key('filters', 'posted', 'test_filter')
+        redis_connection.delete(self.key)
+        self.addCleanup(redis_connection.delete, self.key)
+
+    def test_changed_results(self):
+        rows = [('namad', 1200, 2.5)]
+        self.assertDictEqual(changed_results({'test_filter': rows}), {'test_filter': result_digest(rows)})
+
+        # Digest of posted rows is shared between workers, not kept in memory of a process
+        redis_connection.set(self.key, result_digest(rows))
+        self.assertDictEqual(changed_results({'test_filter': list(rows)}), {})
+        self.assertIn('test_filter', changed_results({'test_filter': rows + [('namad2', 100, 1.0)]}))
+
+
+@mock.patch('apps.filters.tasks.call_filters')
+class TriggerFiltersTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        redis_connection.delete(TRIGGERED_KEY, PENDING_KEY)
+        self.addCleanup(redis_connection.delete, TRIGGERED_KEY, PENDING_KEY)
+
+    def test_min_interval(self, call_filters):
+        self.assertFalse(trigger_filters(0))
+        self.assertTrue(trigger_filters(10))
+        call_filters.delay.assert_called_once()
+        mark_cycle_started()
+
+        # Triggers in the interval queue only one cycle for its end
+        self.assertTrue(trigger_filters(10))
+        self.assertFalse(trigger_filters(10))
+        call_filters.apply_async.assert_called_once()
+        self.assertGreater(call_filters.apply_async.call_args.kwargs['countdown'], 0)
+
+        # The pending cycle starts a new interval, a trigger in it is queued again instead of running at once
+        mark_cycle_started()
+        self.assertTrue(trigger_filters(10))
+        call_filters.delay.assert_called_once()
+        self.assertEqual(call_filters.apply_async.call_count, 2)
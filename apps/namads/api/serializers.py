@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from utils.chart_cache import SERIES_RESOLUTIONS
+
+
+class ChartDataQuerySerializer(serializers.Serializer):
+    resolution = serializers.ChoiceField(choices=list(SERIES_RESOLUTIONS), required=False)
+    since = serializers.IntegerField(min_value=0, required=False)
+    since_version = serializers.IntegerField(min_value=0, required=False)
@@ -1,3 +1,6 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 
 
@@ -12,9 +15,11 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from apps.blog.api.serializers import NamadSerializer
 from apps.commenting.api.serializers import BaseCommentVoteSerializer, BaseCommentSerializer
 from apps.commenting.api.views import BaseCommentViewSet
+from apps.namads.api.serializers import ChartDataQuerySerializer
 from apps.namads.models import Namad, NamadComment, NamadCommentVote
+from apps.tsetmc.charts import render_chart_changes, render_chart_data
 from utils.permissions import FilterPermission
-from utils.utils import redis_cache
+from utils.chart_cache import dump_json, namad_chart_cache
 
 
 class NamadViewSet(ListModelMixin,
@@ -37,9 +42,22 @@ class NamadViewSet(ListModelMixin,
         chart_data:
             Return daily and sections data based on specific namad id
 
+            query parameters
+            -  resolution: resolution of money_entry_graph, one of 'raw', '1m' and '5m'. Ex: ?resolution=1m
+               Raw points of the last 30 minutes, 1m points of the last 2 hours and 5m points before them
+               are returned if it is not set.
+            -  since: time in milliseconds, only points of money_entry_graph after it are returned.
+               Ex: ?since=1607000000000
+            -  since_version: version of data which client has, only changed fields and new points are
+               returned as {'version': ..., 'full': false, 'data': {...}}. Whole data is returned with
+               'full': true if changes are not available. Ex: ?since_version=120
+
+            Version of data and query parameters are returned as ETag, 304 is returned if it matches
+            If-None-Match header.
+
             Extra info: {
                 'sections': {
-                'money_entry_graph': {time, buy_per_i, sell_per_i, i_buyer_seller_pow}
+                'money_entry_graph': {time, buy_per_i, sell_per_i, i_buyer_seller_pow}, time is in milliseconds
                 'order_status_table': {
                     zd1, qd1, pd1, po1, qo1, zo1,
                     zd2, qd2, pd2, po2, qo2, zo2,
@@ -53,7 +71,7 @@ class NamadViewSet(ListModelMixin,
             Note: The keys that aren't mentioned have names.
 
         advance_data:
-            Return advance filter data based on specific namad id
+            Return advance filter data based on specific namad id, query parameters are the same as chart_data
     """
     serializer_class = NamadSerializer
     queryset = Namad.objects.filter(is_enable=True).order_by('-id')
@@ -87,15 +105,55 @@ class NamadViewSet(ListModelMixin,
     @action(detail=True, url_path='chart-data')
     def chart_data(self, request, *args, **kwargs):
         namad = self.get_object()
-        chart_data = redis_cache.get(namad.id, {})
-        chart_data.pop('filter_data', None)
-        return Response(chart_data)
+        return self.chart_response(request, namad)
 
     @action(detail=True, url_path='advance-data', permission_classes=[FilterPermission, ])
     def advance_data(self, request, *args, **kwargs):
         namad = self.get_object()
-        filter_data = redis_cache.get(namad.id, {})
-        return Response(filter_data)
+        return self.chart_response(request, namad)
+
+    @staticmethod
+    def chart_etag(version, query_params):
+        """
+        :param version: version of chart data of namad
+        :param query_params: validated query parameters of chart_data
+        :return: quoted ETag of the version and parameters, responses of other parameters are not matched
+        """
+        params = ';'.join(f'{k}={v}' for k, v in sorted(query_params.items()) if v is not None)
+        return quote_etag(f'{version}-{params}' if params else str(version))
+
+    @classmethod
+    def chart_response(cls, request, namad):
+        query_serializer = ChartDataQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        query_params = dict(query_serializer.validated_data)
+        params = dict(query_params)
+        since_version = params.pop('since_version', None)
+
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etags:
+            etag = cls.chart_etag(namad_chart_cache.get_version(namad.id), query_params)
+            if etag in etags or '*' in etags:
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+        if since_version is None:
+            # Chart data of default parameters is rendered to JSON once and returned as it is until the next update
+            version, content = namad_chart_cache.get_json(namad.id, render_chart_data, **params)
+        else:
+            version, full, chart_data, changed = namad_chart_cache.get_changes(
+                namad.id, since_version, resolution=params.get('resolution')
+            )
+            content = dump_json({
+                'version': version,
+                'full': full,
+                'data': render_chart_data(chart_data) if full else render_chart_changes(chart_data, changed),
+            })
+
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = cls.chart_etag(version, query_params)
+        return response
 
 
 class NamadCommentViewSet(BaseCommentViewSet):
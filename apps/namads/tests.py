@@ -1,3 +1,41 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.namads.api.views import NamadViewSet
+from apps.namads.models import Namad
+
+
+class ChartResponseTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.namad = Namad(id='1234')
+        self.factory = APIRequestFactory()
+        patcher = mock.patch('apps.namads.api.views.namad_chart_cache')
+        self.chart_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chart_cache.get_version.return_value = 7
+        self.chart_cache.get_json.return_value = (7, b'{}')
+
+    def get(self, query, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return NamadViewSet.chart_response(Request(self.factory.get('/', query, **headers)), self.namad)
+
+    def test_etag_of_resolutions(self):
+        etag = self.get({'resolution': 'raw'})['ETag']
+
+        self.assertEqual(self.get({'resolution': 'raw'}, etag).status_code, 304)
+        for query in ({}, {'resolution': '5m'}, {'resolution': 'raw', 'since': 10}):
+            response = self.get(query, etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_of_version(self):
+        etag = self.get({})['ETag']
+        self.chart_cache.get_version.return_value = 8
+        self.chart_cache.get_json.return_value = (8, b'{}')
+
+        response = self.get({}, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.db import transaction
+
+from conf import settings
+from .models import NamadStat
+
+logger = logging.getLogger(__name__)
+
+
+class NamadStatBuffer:
+    """
+    Collects NamadStat rows of a sweep and writes them with bulk inserts, the buffer is flushed
+    when it reaches `flush_size` rows, when its oldest row is buffered for `flush_interval` seconds,
+    at the end of each sweep and on worker shutdown. Rows of a failed insert are kept for the next flush.
+    """
+
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, namad_stat):
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(namad_stat)
+            should_flush = len(self._rows) >= self.flush_size \
+                or time.monotonic() - self._oldest >= self.flush_interval
+
+        if should_flush:
+            try:
+                self.flush()
+            except Exception:
+                # Rows are kept for the next flush and the error is logged by flush
+                pass
+
+    def flush(self):
+        """
+        This function will insert all buffered rows in one transaction, rows are returned to the buffer
+        and the error is raised again if they could not be inserted.
+        :return: count of inserted rows
+        """
+        with self._lock:
+            rows, self._rows = self._rows, []
+
+        if not rows:
+            return 0
+
+        try:
+            with transaction.atomic():
+                NamadStat.objects.bulk_create(rows, batch_size=self.flush_size)
+        except Exception as e:
+            with self._lock:
+                self._rows = rows + self._rows
+                # Failed rows are inserted again after `flush_interval` seconds or by the next flush of sweep
+                self._oldest = time.monotonic()
+            logger.error(
+                "[Exception occurred with flushing namad stats]-"
+                "[Rows count: {}]-"
+                "[Error body: {}]-"
+                "[Error type: {}]".format(
+                    len(rows),
+                    str(e),
+                    type(e)
+                )
+            )
+            raise
+
+        logger.debug(f"[Namad stats flushed]-[Rows count: {len(rows)}]")
+        return len(rows)
+
+
+namad_stat_buffer = NamadStatBuffer(
+    flush_size=settings.TSETMC_STAT_FLUSH_SIZE,
+    flush_interval=settings.TSETMC_STAT_FLUSH_INTERVAL
+)
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def flush_namad_stat_buffer(**kwargs):
+    try:
+        namad_stat_buffer.flush()
+    except Exception:
+        # The error is logged by flush
+        pass
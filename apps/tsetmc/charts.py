@@ -0,0 +1,125 @@
+from datetime import date
+
+from .histories import jalali_calendar
+from .parsers import ORDER_ROWS
+
+ORDER_COLUMNS = ('zd', 'qd', 'pd', 'po', 'qo', 'zo')
+# Raw values are cached and these fields are converted to million and billion on render
+MILLION_FIELDS = ('base_volume',)
+BILLION_FIELDS = ('tvol', 'tval', 'mv', 'stock_number')
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 2) if denominator else None
+
+
+def money_entry_values(sections_data):
+    """
+    This function will compute money entry values of real (i) and legal (n) clients.
+    :param sections_data: dict of raw sections fields
+    :return: dict of money entry values, values which could not be computed are None
+    """
+    s = sections_data
+    return {
+        'buy_per_i': _ratio(s['pc'] * s['buy_i_volume'], s['buy_counti']),
+        'sell_per_i': _ratio(s['pc'] * s['sell_n_volume'], s['sell_counti']),
+        'i_buyer_seller_pow': _ratio(
+            s['buy_i_volume'] * s['sell_counti'], s['buy_counti'] * s['sell_i_volume']
+        ),
+        'buy_per_n': s['pc'] * s['buy_n_volume'] / s['buy_countn'] if s['buy_countn'] else None,
+        'sell_per_n': s['pc'] * s['sell_n_volume'] / s['sell_countn'] if s['sell_countn'] else None,
+        'n_buyer_seller_pow': _ratio(
+            s['buy_n_volume'] * s['sell_countn'], s['buy_countn'] * s['sell_n_volume']
+        ),
+    }
+
+
+def money_entry_point(sections_data, timestamp):
+    """
+    :param sections_data: dict of raw sections fields
+    :param timestamp: time of point in milliseconds
+    :return: raw point of money entry graph, (time, buy_per_i, sell_per_i, i_buyer_seller_pow)
+    """
+    values = money_entry_values(sections_data)
+    return timestamp, values['buy_per_i'], values['sell_per_i'], values['i_buyer_seller_pow']
+
+
+def _million(value):
+    return f"{round(value / 1e6, 2):,} M" if value else ''
+
+
+def render_sections(sections_data):
+    """
+    This function will convert raw sections data of cache to the data which is returned by chart-data API.
+    :param sections_data: dict of raw sections fields and `money_entry_graph` points
+    :return: dict of formatted sections data
+    """
+    data = dict(sections_data)
+    graph = data.pop('money_entry_graph', [])
+    if 'pc' in data:
+        data['order_status_table'] = [
+            [f"{data.pop(f'{column}{i}'):,}" for column in ORDER_COLUMNS] for i in range(1, ORDER_ROWS + 1)
+        ]
+        values = money_entry_values(data)
+        data['money_entry_data'] = {
+            # Real Part
+            'buy_per_i': _million(values['buy_per_i']),
+            'sell_per_i': _million(values['sell_per_i']),
+            'i_buyer_seller_pow': '' if values['i_buyer_seller_pow'] is None else values['i_buyer_seller_pow'],
+            # Legal Part
+            'buy_per_n': _million(values['buy_per_n']),
+            'sell_per_n': _million(values['sell_per_n']),
+            'n_buyer_seller_pow': '' if values['n_buyer_seller_pow'] is None else values['n_buyer_seller_pow'],
+        }
+        _format_volumes(data)
+    data['money_entry_graph'] = [['' if v is None else v for v in point] for point in graph]
+    return data
+
+
+def render_daily(daily_data):
+    """
+    This function will convert raw daily data of cache to the data which is returned by chart-data API.
+    :param daily_data: dict of raw daily fields
+    :return: dict of formatted daily data
+    """
+    data = dict(daily_data)
+    _format_volumes(data)
+    if 'price_volume_graph' in data:
+        data['price_volume_graph'] = [
+            (day.strftime('%Y-%m-%d'), jalali_calendar[day], pc, tvol)
+            for day, pc, tvol in ((date.fromordinal(p[0]), p[1], p[2]) for p in data['price_volume_graph'])
+        ]
+    return data
+
+
+def _format_volumes(data):
+    for field in MILLION_FIELDS:
+        if field in data:
+            data[field] = f"{data[field] / 1e6:,} M"
+    for field in BILLION_FIELDS:
+        if field in data:
+            data[field] = f"{data[field] / 1e9:,} B"
+
+
+def render_chart_data(chart_data):
+    """
+    :param chart_data: raw chart data of namad, Ex: returned by `NamadChartCache.get`
+    :return: dict of formatted chart data
+    """
+    renderers = {'daily': render_daily, 'sections': render_sections}
+    return {part: renderers[part](data) if part in renderers else data for part, data in chart_data.items()}
+
+
+def render_chart_changes(chart_data, changed):
+    """
+    This function will render changed fields of chart data, fields which are derived from other
+    fields (Ex: order_status_table) are returned if any field of their part is changed.
+    :param chart_data: raw chart data of namad with whole fields of changed parts
+    :param changed: dict of part and its changed fields
+    :return: dict of formatted changed data
+    """
+    rendered = render_chart_data(chart_data)
+    return {
+        part: {k: v for k, v in rendered[part].items() if k in fields or k not in chart_data[part]}
+        for part, fields in changed.items() if part in rendered
+    }
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from conf import settings
+
+BASE_URL = 'http://tsetmc.com'
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class LatencyCounter:
+    __slots__ = ('count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed, failed=False):
+        self.count += 1
+        self.errors += int(failed)
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total * 1e3 / self.count, 2) if self.count else 0,
+            'max_ms': round(self.max * 1e3, 2),
+        }
+
+
+class TsetmcClient:
+    """
+    Shared client of TSETMC requests, each process keeps its own pooled keep-alive session.
+    Failed connections and 5xx responses are retried with exponential backoff and latency of
+    each endpoint is counted.
+    """
+
+    def __init__(self, base_url=BASE_URL):
+        self.base_url = base_url
+        self.timeout = (settings.TSETMC_CONNECTION_CONNECT_TIMEOUT, settings.TSETMC_CONNECTION_READ_TIMEOUT)
+        self._session = None
+        self._session_pid = None
+        self._latencies = defaultdict(LatencyCounter)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Sessions should not be shared between forked worker processes
+        if self._session is None or self._session_pid != os.getpid():
+            self._session = self._create_session()
+            self._session_pid = os.getpid()
+        return self._session
+
+    @staticmethod
+    def _create_session():
+        retry = Retry(
+            total=settings.TSETMC_CONNECTION_RETRIES,
+            backoff_factor=settings.TSETMC_CONNECTION_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=settings.TSETMC_CONNECTION_POOL_SIZE,
+            pool_maxsize=settings.TSETMC_CONNECTION_POOL_SIZE,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def url(self, path):
+        return f'{self.base_url}/{path}'
+
+    def record(self, path, elapsed, failed=False):
+        with self._lock:
+            self._latencies[path].add(elapsed, failed)
+
+    def latency_stats(self):
+        """
+        :return: dict of latency counters of each requested endpoint in current process
+        """
+        with self._lock:
+            return {path: counter.as_dict() for path, counter in self._latencies.items()}
+
+    def get(self, path, params=None, **kwargs):
+        """
+        This function will send a GET request to specific TSETMC endpoint.
+        :param path: path of endpoint, Ex: 'Loader.aspx'
+        :param params: query parameters of request
+        :return: response object, raises requests exceptions like `requests.get`
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        started, failed = time.monotonic(), True
+        try:
+            response = self.session.get(self.url(path), params=params, **kwargs)
+            failed = not response.ok
+            return response
+        finally:
+            self.record(path, time.monotonic() - started, failed)
+
+    def async_session(self, limit=None):
+        """
+        :param limit: maximum number of open connections
+        :return: aiohttp client session which should be used as an async context manager
+        """
+        connector = aiohttp.TCPConnector(
+            limit=limit or settings.TSETMC_CONNECTION_POOL_SIZE,
+            limit_per_host=limit or settings.TSETMC_CONNECTION_POOL_SIZE
+        )
+        timeout = aiohttp.ClientTimeout(
+            connect=settings.TSETMC_CONNECTION_CONNECT_TIMEOUT,
+            sock_read=settings.TSETMC_CONNECTION_READ_TIMEOUT
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def async_get(self, session, path, params=None, with_headers=False, reader=None):
+        """
+        This function will send a GET request to specific TSETMC endpoint using an aiohttp session.
+        :param session: session which is created by `async_session`
+        :param path: path of endpoint, Ex: 'tsev2/data/instinfodata.aspx'
+        :param params: query parameters of request
+        :param with_headers: determine if response headers should be returned too
+        :param reader: coroutine function which reads the response instead of reading the whole text
+        :return: response text or reader result (and headers), raises aiohttp exceptions after all retries are failed
+        """
+        retries = settings.TSETMC_CONNECTION_RETRIES
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(settings.TSETMC_CONNECTION_BACKOFF_FACTOR * (2 ** (attempt - 1)))
+
+            started = time.monotonic()
+            try:
+                async with session.get(self.url(path), params=params) as response:
+                    if response.status in RETRY_STATUSES and attempt < retries:
+                        self.record(path, time.monotonic() - started, failed=True)
+                        continue
+                    response.raise_for_status()
+                    text = await reader(response) if reader else await response.text()
+                    headers = response.headers
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.record(path, time.monotonic() - started, failed=True)
+                if attempt < retries:
+                    continue
+                raise
+            except Exception:
+                self.record(path, time.monotonic() - started, failed=True)
+                raise
+
+            self.record(path, time.monotonic() - started)
+            return (text, headers) if with_headers else text
+
+
+tsetmc_client = TsetmcClient()
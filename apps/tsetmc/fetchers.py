@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from functools import partial
+
+import aiohttp
+
+from conf import settings
+from .client import tsetmc_client
+from .fingerprints import payload_fingerprint
+from .utils import TopInstScanner
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_PATH = 'tsev2/data/instinfodata.aspx'
+NAMAD_PAGE_PATH = 'Loader.aspx'
+CHUNK_SIZE = 8 * 1024
+# Progress of fetching sections is reported per this many fetched namads
+PROGRESS_SIZE = 50
+
+
+async def _fetch(session, semaphore, namad_key, path, params, **kwargs):
+    """
+    This function will fetch a TSETMC endpoint for a specific namad and log its exceptions.
+    :param session: shared aiohttp client session
+    :param semaphore: semaphore which bounds the concurrent requests
+    :param namad_key: key of specific namad
+    :param path: path of endpoint
+    :param params: query parameters of request
+    :param kwargs: extra arguments of `TsetmcClient.async_get`
+    :return: result of `TsetmcClient.async_get` and None if any exception occurs
+    """
+    async with semaphore:
+        try:
+            return await tsetmc_client.async_get(session, path, params=params, **kwargs)
+        except aiohttp.ClientResponseError as err:
+            logger.error(
+                "[TSETMC HTTPError]-"
+                "[Namad key: {}]-"
+                "[Status code: {}]".format(
+                    namad_key,
+                    err.status,
+                )
+            )
+        except asyncio.TimeoutError:
+            logger.error(
+                "[TSETMC Timeout]-"
+                "[Namad key: {}]-"
+                "[Connection Timeout = {}]".format(
+                    namad_key,
+                    settings.TSETMC_CONNECTION_CONNECT_TIMEOUT
+                )
+            )
+        except Exception as e:
+            logger.error(
+                "[TSETMC Exception]-"
+                "[Namad key: {}]-"
+                "[Error body: {}]-"
+                "[Error type: {}]".format(
+                    namad_key,
+                    str(e),
+                    type(e)
+                )
+            )
+
+    return None
+
+
+async def _fetch_section(session, semaphore, namad_key, script):
+    """
+    This function will fetch instinfodata payload of a specific namad.
+    :param session: shared aiohttp client session
+    :param semaphore: semaphore which bounds the concurrent requests
+    :param namad_key: key of specific namad
+    :param script: value of the appending value of url
+    :return: tuple of namad key, script, payload text and its fingerprint (None if any exception occurs)
+    """
+    params = {
+        "i": namad_key,
+        "c": f'{script}+'
+    }
+    result = await _fetch(session, semaphore, namad_key, SECTIONS_PATH, params, with_headers=True)
+    if result is None:
+        return namad_key, script, None, None
+
+    text, headers = result
+    return namad_key, script, text, payload_fingerprint(text, headers)
+
+
+async def _read_top_inst(response):
+    """
+    This function will stream namad page and stop reading as soon as TopInst script block is found.
+    :param response: aiohttp response object
+    :return: text of script block and None if it could not be found
+    """
+    scanner = TopInstScanner()
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        if scanner.feed(chunk):
+            break
+    return scanner.script
+
+
+async def _fetch_daily_script(session, semaphore, namad_key):
+    """
+    This function will fetch TopInst script block of a specific namad's page.
+    :param session: shared aiohttp client session
+    :param semaphore: semaphore which bounds the concurrent requests
+    :param namad_key: key of specific namad
+    :return: tuple of namad key and script text (None if any exception occurs)
+    """
+    params = {
+        "ParTree": 151311,
+        "i": namad_key
+    }
+    return namad_key, await _fetch(session, semaphore, namad_key, NAMAD_PAGE_PATH, params, reader=_read_top_inst)
+
+
+async def _read_status(response):
+    """
+    This function will only check status of response, body of response is not read.
+    :param response: aiohttp response object
+    :return: True
+    """
+    return True
+
+
+async def _fetch_namad_page(session, semaphore, key, params, reader=None):
+    """
+    This function will fetch a Loader.aspx page.
+    :param session: shared aiohttp client session
+    :param semaphore: semaphore which bounds the concurrent requests
+    :param key: key of requested page for logging, Ex: namad key
+    :param params: query parameters of request
+    :param reader: coroutine function which reads the response instead of reading the whole text
+    :return: tuple of key and page text or reader result (None if any exception occurs)
+    """
+    return key, await _fetch(session, semaphore, key, NAMAD_PAGE_PATH, params, reader=reader)
+
+
+async def _gather(coroutine_func, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Keep-alive connections are reused across all requests of the job
+    async with tsetmc_client.async_session(limit=concurrency) as session:
+        return await asyncio.gather(
+            *[coroutine_func(session, semaphore, *item) for item in items]
+        )
+
+
+def fetch_sections(namads, concurrency=None, progress=None):
+    """
+    This function will fetch instinfodata payloads of all given namads concurrently.
+    Note: it should not be called from a running event loop.
+    :param namads: iterable of (namad_key, script) tuples
+    :param concurrency: maximum number of in-flight requests
+    :param progress: function which is called by count of fetched payloads per `PROGRESS_SIZE` payloads
+    :return: list of (namad_key, script, payload text, fingerprint) tuples, payload is None for failed requests
+    """
+    namads = list(namads)
+    if not namads:
+        return []
+
+    fetched_count = 0
+
+    async def fetch_section(session, semaphore, namad_key, script):
+        nonlocal fetched_count
+        result = await _fetch_section(session, semaphore, namad_key, script)
+        if result[2] is not None:
+            fetched_count += 1
+            if progress and fetched_count % PROGRESS_SIZE == 0:
+                progress(fetched_count)
+        return result
+
+    return asyncio.run(
+        _gather(fetch_section, namads, concurrency or settings.TSETMC_SECTIONS_CONCURRENCY)
+    )
+
+
+def fetch_daily_scripts(namad_keys, concurrency=None):
+    """
+    This function will fetch TopInst script block of all given namads pages concurrently.
+    Note: it should not be called from a running event loop.
+    :param namad_keys: iterable of namad keys
+    :param concurrency: maximum number of in-flight requests
+    :return: list of (namad_key, script text) tuples, script is None for failed requests
+    """
+    namad_keys = [(namad_key,) for namad_key in namad_keys]
+    if not namad_keys:
+        return []
+
+    return asyncio.run(
+        _gather(_fetch_daily_script, namad_keys, concurrency or settings.TSETMC_DAILY_CONCURRENCY)
+    )
+
+
+def fetch_namad_pages(pages, concurrency=None, body=True):
+    """
+    This function will fetch Loader.aspx pages concurrently.
+    Note: it should not be called from a running event loop.
+    :param pages: iterable of (key, params) tuples, Ex: ('35424116338766901', {'ParTree': 151311, 'i': ...})
+    :param concurrency: maximum number of in-flight requests
+    :param body: determine if body of pages should be read, only success of requests is returned otherwise
+    :return: list of (key, page text) tuples or (key, True) if body is not read, None for failed requests
+    """
+    pages = list(pages)
+    if not pages:
+        return []
+
+    return asyncio.run(
+        _gather(
+            partial(_fetch_namad_page, reader=None if body else _read_status),
+            pages,
+            concurrency or settings.TSETMC_DAILY_CONCURRENCY
+        )
+    )
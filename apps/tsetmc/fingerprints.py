@@ -0,0 +1,58 @@
+import zlib
+
+from utils.utils import redis_connection, redis_key
+
+FINGERPRINTS_TIMEOUT = 60 * 60 * 4
+
+
+def payload_fingerprint(payload, headers=None):
+    """
+    This function will make a cheap fingerprint of a raw payload, ETag or Last-Modified
+    headers are used if the response has them.
+    :param payload: raw text of response
+    :param headers: headers of response
+    :return: fingerprint string
+    """
+    if headers:
+        for header in ('ETag', 'Last-Modified'):
+            if headers.get(header):
+                return f'{header}:{headers[header]}'
+
+    return format(zlib.crc32(payload.encode()), 'x')
+
+
+class SectionFingerprints:
+    """
+    Keeps last seen fingerprint of each namad's sections payload in a single redis hash.
+    """
+
+    def __init__(self, name='tsetmc:section_fingerprints', timeout=FINGERPRINTS_TIMEOUT):
+        self.key = redis_key(name)
+        self.timeout = timeout
+
+    def load(self, namad_keys):
+        """
+        :param namad_keys: list of namad keys
+        :return: dict of namad key and its stored fingerprint
+        """
+        namad_keys = list(namad_keys)
+        if not namad_keys:
+            return {}
+
+        values = redis_connection.hmget(self.key, namad_keys)
+        return {k: v.decode() for k, v in zip(namad_keys, values) if v is not None}
+
+    def save(self, fingerprints):
+        """
+        :param fingerprints: dict of namad key and its new fingerprint
+        """
+        if not fingerprints:
+            return
+
+        pipeline = redis_connection.pipeline(transaction=False)
+        pipeline.hset(self.key, mapping=fingerprints)
+        pipeline.expire(self.key, self.timeout)
+        pipeline.execute()
+
+
+section_fingerprints = SectionFingerprints()
@@ -0,0 +1,165 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection
+from khayyam import JalaliDate
+
+from utils.chart_cache import namad_chart_cache
+from .models import NamadHistory, NamadStat
+from .parsers import ORDER_FIELDS
+
+PRICE_VOLUME_DAYS = 365
+STATS_TABLE = NamadStat._meta.db_table
+HISTORIES_TABLE = NamadHistory._meta.db_table
+# Columns of history which are copied from the base stat of the day, `id` of history is the id of its base stat
+COPIED_COLUMNS = [
+    f.column for f in NamadHistory._meta.concrete_fields if f.name not in ('stat_date', 'b_closed', 'a_closed')
+]
+
+
+def _closed_json(alias):
+    return 'jsonb_build_object({})'.format(', '.join(f"'{f}', {alias}.{f}" for f in ORDER_FIELDS))
+
+
+ROLLUP_SQL = f"""
+WITH last_stats AS (
+    SELECT
+        namad_id,
+        MAX(id) FILTER (WHERE checksum_time <= %(split_time)s) AS b_id,
+        MAX(id) FILTER (WHERE checksum_time > %(split_time)s) AS a_id
+    FROM {STATS_TABLE}
+    GROUP BY namad_id
+), day_stats AS (
+    SELECT
+        LEAST(b_id, a_id) AS base_id,
+        CASE WHEN b_id IS NOT NULL AND a_id IS NOT NULL THEN GREATEST(b_id, a_id) END AS other_id
+    FROM last_stats
+)
+INSERT INTO {HISTORIES_TABLE} ({', '.join(COPIED_COLUMNS)}, stat_date, b_closed, a_closed)
+SELECT
+    {', '.join(f'base.{c}' for c in COPIED_COLUMNS)},
+    base.created_time::date,
+    {_closed_json('base')},
+    CASE WHEN other.id IS NULL THEN '{{}}'::jsonb ELSE {_closed_json('other')} END
+FROM day_stats
+JOIN {STATS_TABLE} base ON base.id = day_stats.base_id
+LEFT JOIN {STATS_TABLE} other ON other.id = day_stats.other_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM {HISTORIES_TABLE} history
+    WHERE history.namad_id = base.namad_id AND history.stat_date = base.created_time::date
+)
+ON CONFLICT DO NOTHING
+RETURNING namad_id, stat_date, pc, tvol
+"""
+
+
+class JalaliCalendar:
+    """
+    Lookup table of Jalali date strings, dates of the last `days` days are computed once
+    and other dates are added on the first lookup.
+    """
+
+    def __init__(self, days=PRICE_VOLUME_DAYS + 30):
+        self.days = days
+        self._dates = {}
+
+    def _fill(self, start, days):
+        jalali = JalaliDate(start)
+        for i in range(days):
+            self._dates[start + timedelta(days=i)] = (jalali + timedelta(days=i)).strftime('%Y-%m-%d')
+
+    def __getitem__(self, day):
+        if not self._dates:
+            self._fill(date.today() - timedelta(days=self.days), self.days + 30)
+        if day not in self._dates:
+            self._fill(day, 1)
+        return self._dates[day]
+
+
+jalali_calendar = JalaliCalendar()
+
+
+def price_volume_point(stat_date, pc, tvol):
+    """
+    :return: raw point of price volume graph, day is stored as its ordinal and it is formatted on render
+    """
+    return stat_date.toordinal(), pc, tvol
+
+
+def rollup_namad_stats(split_time):
+    """
+    This function will insert a history row for each namad from its last stats with one statement.
+    Base row is the older one of the last stat before (and including) `split_time` and the last stat after it,
+    order tables of these stats are stored in `b_closed` and `a_closed`. Rows of namads which already have
+    a history of that day are skipped, so it is safe to run it again.
+    :param split_time: checksum time which splits the day, Ex: 12:30:00
+    :return: list of (namad_id, stat_date, pc, tvol) tuples of inserted histories
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(ROLLUP_SQL, {'split_time': split_time})
+        return cursor.fetchall()
+
+
+def history_price_volume_graphs(namad_ids=None, days=PRICE_VOLUME_DAYS):
+    """
+    This function will build price volume graph of namads from their histories with one query.
+    :param namad_ids: list of namad ids, graphs of all namads are built if it is not set
+    :param days: count of days which are kept in graph
+    :return: dict of namad id and its graph
+    """
+    filters = {'stat_date__gte': date.today() - timedelta(days=days)}
+    if namad_ids is not None:
+        filters['namad_id__in'] = namad_ids
+    history_data = NamadHistory.objects.filter(
+        **filters
+    ).order_by('stat_date').values_list('namad_id', 'stat_date', 'pc', 'tvol')
+
+    graphs = defaultdict(list)
+    for namad_id, stat_date, pc, tvol in history_data.iterator():
+        graphs[namad_id].append(price_volume_point(stat_date, pc, tvol))
+    return dict(graphs)
+
+
+def append_price_volume_points(histories, days=PRICE_VOLUME_DAYS):
+    """
+    This function will append new history points to price volume graph of namads and drop points which are
+    older than `days`, sections series of namads are cleared too. Graphs which are not cached (Ex: after
+    deploy or after redis is flushed) are built from histories instead.
+    :param histories: iterable of (namad_id, stat_date, pc, tvol) tuples
+    :param days: count of days which are kept in graph
+    :return: count of updated namads
+    """
+    points = {namad_id: price_volume_point(stat_date, pc, tvol) for namad_id, stat_date, pc, tvol in histories}
+    if not points:
+        return 0
+
+    cutoff = (date.today() - timedelta(days=days)).toordinal()
+    graphs = namad_chart_cache.get_fields(list(points), 'daily', 'price_volume_graph')
+    # Graphs of an older format (points which their day is not an ordinal) are built again too
+    missing_ids = [
+        namad_id for namad_id, graph in graphs.items()
+        if graph is None or any(not isinstance(p[0], int) for p in graph)
+    ]
+    if missing_ids:
+        graphs.update(dict.fromkeys(missing_ids, []))
+        graphs.update(history_price_volume_graphs(missing_ids, days))
+    for namad_id, point in points.items():
+        # Days are ordinals, points of the same day are replaced on a second run
+        graphs[namad_id] = [p for p in graphs[namad_id] if cutoff <= p[0] < point[0]] + [point]
+
+    namad_chart_cache.write(
+        {namad_id: {'daily': {'price_volume_graph': graph}} for namad_id, graph in graphs.items()},
+        clear=list(points)
+    )
+    return len(points)
+
+
+def rebuild_price_volume_graphs(days=PRICE_VOLUME_DAYS):
+    """
+    This function will rebuild price volume graph of all namads from their histories.
+    :param days: count of days which are kept in graph
+    :return: count of updated namads
+    """
+    graphs = history_price_volume_graphs(days=days)
+    namad_chart_cache.write({namad_id: {'daily': {'price_volume_graph': graph}} for namad_id, graph in graphs.items()})
+    return len(graphs)
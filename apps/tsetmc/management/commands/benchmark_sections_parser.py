@@ -0,0 +1,80 @@
+import timeit
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from apps.tsetmc.parsers import parse_sections, parse_sections_batch
+
+SAMPLE_PAYLOAD = (
+    "12:29:59,A ,21480,20790,21490,20490,21490,19960,2596,4167003,86638155720,0,20201213,122959;"
+    "98/9/23 12:29:59,F,21480,<div class='pn'>20790</div>,21490,20490,21490,19960,2596,4167003,86638155720,0,20201213,122959;"
+    "11@607804@20640@20680@17607@4,4@7454@20630@20710@366@1,6@7629@20620@20750@15619@2,;"
+    "20490,20790,;"
+    "3935979,226843,,4050322,112500,1346,2,,788,1,;"
+    ";;;"
+)
+
+# The loop which was used in insert_namad_sections before parsers module, it is kept as the benchmark baseline
+LEGACY_INDEX_MAP = {
+    "00": "checksum_time", "01": "status", "02": "pl", "03": "pc", "04": "pf", "05": "py",
+    "06": "pmax", "07": "pmin", "08": "tno", "09": "tvol", "010": "tval",
+    "20": "zd1", "21": "qd1", "22": "pd1", "23": "po1", "24": "qo1", "25": "zo1",
+    "26": "zd2", "27": "qd2", "28": "pd2", "29": "po2", "210": "qo2", "211": "zo2",
+    "212": "zd3", "213": "qd3", "214": "pd3", "215": "po3", "216": "qo3", "217": "zo3",
+    "40": "Buy_I_Volume", "41": "Buy_N_Volume", "43": "Sell_I_Volume", "44": "Sell_N_Volume",
+    "45": "Buy_CountI", "46": "Buy_CountN", "48": "Sell_CountI", "49": "Sell_CountN"
+}
+LEGACY_SECTIONS = [0, 2, 4]
+
+
+def legacy_parse_sections(payload):
+    ready_data = dict()
+    for index, section in enumerate(payload.split(';')):
+        if index not in LEGACY_SECTIONS:
+            continue
+
+        section_value = section.split(',')
+
+        if index == 2:
+            structured_section = []
+            for temp_i in range(len(section_value) - 1):
+                sub_section = list(map(int, section_value[temp_i].split('@')))
+                structured_section.append(sub_section)
+
+            section_value = list(chain(*structured_section))
+
+        for sec_index, sec_value in enumerate(section_value):
+            if "{}{}".format(index, sec_index) not in LEGACY_INDEX_MAP.keys():
+                continue
+
+            try:
+                val = float(sec_value) if int(sec_value) != float(sec_value) else int(sec_value)
+
+            except (ValueError, TypeError):
+                val = sec_value.strip() if sec_value != '' else None
+
+            if val not in ['', None]:
+                ready_data[LEGACY_INDEX_MAP.get("{}{}".format(index, sec_index))] = val
+
+    return ready_data
+
+
+class Command(BaseCommand):
+    help = "Benchmark instinfodata sections parser against the legacy parsing loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help="Number of payloads in each round")
+        parser.add_argument('--rounds', type=int, default=5, help="Number of rounds")
+
+    def handle(self, *args, **options):
+        count, rounds = options['count'], options['rounds']
+        payloads = [SAMPLE_PAYLOAD] * count
+
+        results = {
+            'legacy loop': lambda: [legacy_parse_sections(p) for p in payloads],
+            'parse_sections': lambda: [parse_sections(p) for p in payloads],
+            'parse_sections_batch': lambda: parse_sections_batch(payloads),
+        }
+        for name, func in results.items():
+            best = min(timeit.repeat(func, number=1, repeat=rounds))
+            self.stdout.write(f"{name}: {best * 1e3:.2f} ms per {count} payloads ({best * 1e6 / count:.2f} us per payload)")
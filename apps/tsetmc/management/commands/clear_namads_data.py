@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from apps.namads.models import Namad
+from utils.chart_cache import namad_chart_cache
 from utils.utils import redis_cache
 
 
@@ -9,5 +10,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         namad_ids = Namad.objects.values_list('id', flat=True)
+        # Blobs of the old pickled layout are removed too
         self.stdout.write(f"Total deleted redis cache count: {redis_cache.delete_many(namad_ids)}")
+        self.stdout.write(f"Total deleted chart data keys count: {namad_chart_cache.delete_many(namad_ids)}")
         self.stdout.write(f"Total namads count: {namad_ids.count()}")
@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tsetmc import partitions
+
+
+class Command(BaseCommand):
+    help = "Manage daily partitions of NamadStat table, create next days partitions and drop old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help="Convert NamadStat table to a partitioned table")
+        parser.add_argument('--days-ahead', type=int, default=1, help="Count of next days which their partitions are created")
+        parser.add_argument('--keep-days', type=int, default=None, help="Drop partitions which are older than this many days")
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            if partitions.is_partitioned():
+                raise CommandError(f"{partitions.TABLE} is already partitioned")
+            partitions.convert_to_partitioned(options['days_ahead'])
+            self.stdout.write(f"{partitions.TABLE} is converted to a partitioned table")
+
+        if not partitions.is_partitioned():
+            raise CommandError(f"{partitions.TABLE} is not partitioned, use --convert first")
+
+        for name in partitions.ensure_partitions(options['days_ahead']):
+            self.stdout.write(f"Partition is ready: {name}")
+
+        if options['keep_days'] is not None:
+            before = date.today() - timedelta(days=options['keep_days'])
+            for name in partitions.drop_partitions(before):
+                self.stdout.write(f"Partition is dropped: {name}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.tsetmc.snapshots import latest_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild latest sections snapshot of namads from today's NamadStat rows, Ex: after redis is flushed"
+
+    def handle(self, *args, **options):
+        snapshot = latest_snapshot.rebuild()
+        self.stdout.write(f"Latest snapshot is rebuilt with {len(snapshot)} namads")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.tsetmc.histories import PRICE_VOLUME_DAYS, rebuild_price_volume_graphs
+
+
+class Command(BaseCommand):
+    help = "Rebuild price volume graph of all namads in redis cache from their histories"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=PRICE_VOLUME_DAYS, help="Count of days which are kept in graph")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Total rebuilt graphs count: {rebuild_price_volume_graphs(options['days'])}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.tsetmc.sweeps import sweep_coordinator
+
+
+class Command(BaseCommand):
+    help = "Show state of the last sections sweep and sweeps latency metrics"
+
+    def handle(self, *args, **options):
+        for key, value in sweep_coordinator.metrics().items():
+            self.stdout.write(f"{key}: {value}")
@@ -0,0 +1,177 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# Positional offsets of instinfodata sections, each payload is a `;` separated list of sections
+PRICE_SECTION = 0
+ORDERS_SECTION = 2
+CLIENTS_SECTION = 4
+
+# Table A: offsets 0 to 10 of price section
+PRICE_FIELDS = ('checksum_time', 'status', 'pl', 'pc', 'pf', 'py', 'pmax', 'pmin', 'tno', 'tvol', 'tval')
+# Table B: first three rows of orders section, each row is `zd@qd@pd@po@qo@zo`
+ORDER_ROWS = 3
+ORDER_FIELDS = tuple(f'{f}{i}' for i in range(1, ORDER_ROWS + 1) for f in ('zd', 'qd', 'pd', 'po', 'qo', 'zo'))
+# Table C: offsets of clients section, offsets 2 and 7 are not used
+CLIENT_OFFSETS = (0, 1, 3, 4, 5, 6, 8, 9)
+CLIENT_FIELDS = (
+    'buy_i_volume', 'buy_n_volume', 'sell_i_volume', 'sell_n_volume',
+    'buy_counti', 'buy_countn', 'sell_counti', 'sell_countn'
+)
+
+
+class SectionRecord(NamedTuple):
+    checksum_time: str
+    status: str
+    pl: int
+    pc: int
+    pf: int
+    py: int
+    pmax: int
+    pmin: int
+    tno: int
+    tvol: int
+    tval: int
+
+    zd1: int
+    qd1: int
+    pd1: int
+    po1: int
+    qo1: int
+    zo1: int
+    zd2: int
+    qd2: int
+    pd2: int
+    po2: int
+    qo2: int
+    zo2: int
+    zd3: int
+    qd3: int
+    pd3: int
+    po3: int
+    qo3: int
+    zo3: int
+
+    buy_i_volume: int
+    buy_n_volume: int
+    sell_i_volume: int
+    sell_n_volume: int
+    buy_counti: int
+    buy_countn: int
+    sell_counti: int
+    sell_countn: int
+
+
+SECTION_DTYPE = np.dtype(
+    [('checksum_time', 'U8'), ('status', 'U4')] + [(f, np.int64) for f in SectionRecord._fields[2:]]
+)
+_PRICE_NUMBERS_END = len(PRICE_FIELDS)
+_ORDER_NUMBERS_COUNT = len(ORDER_FIELDS)
+
+
+def _to_ints(values):
+    try:
+        return list(map(int, values))
+    except ValueError:
+        # Some values may be sent as float strings such as "1200.0"
+        return [int(float(v)) for v in values]
+
+
+def _to_int_column(column):
+    """
+    :param column: numpy array of number strings
+    :return: tuple of int64 array and boolean array of valid values
+    """
+    valid = np.ones(len(column), dtype=bool)
+    try:
+        return column.astype(np.int64), valid
+    except ValueError:
+        pass
+    try:
+        # Some values may be sent as float strings such as "1200.0"
+        return column.astype(np.float64).astype(np.int64), valid
+    except ValueError:
+        pass
+
+    values = np.zeros(len(column), dtype=np.int64)
+    for i, value in enumerate(column.tolist()):
+        try:
+            values[i] = int(float(value))
+        except ValueError:
+            valid[i] = False
+    return values, valid
+
+
+def _split_sections(payload):
+    """
+    :param payload: raw text of instinfodata response
+    :return: list of texts of record fields in order of SectionRecord and None if payload is not complete
+    """
+    sections = payload.split(';', CLIENTS_SECTION + 1)
+    if len(sections) <= CLIENTS_SECTION:
+        return None
+
+    price = sections[PRICE_SECTION].split(',', _PRICE_NUMBERS_END)
+    orders = sections[ORDERS_SECTION].replace('@', ',').split(',')
+    clients = sections[CLIENTS_SECTION].split(',')
+    if len(price) < _PRICE_NUMBERS_END or len(orders) < _ORDER_NUMBERS_COUNT or len(clients) <= CLIENT_OFFSETS[-1]:
+        return None
+
+    checksum_time, status = price[0].strip(), price[1].strip()
+    if not checksum_time or not status:
+        return None
+
+    return (
+        [checksum_time, status]
+        + price[2:_PRICE_NUMBERS_END]
+        + orders[:_ORDER_NUMBERS_COUNT]
+        + [clients[i] for i in CLIENT_OFFSETS]
+    )
+
+
+def parse_sections(payload):
+    """
+    This function will parse raw instinfodata payload to a section record in one pass.
+    :param payload: raw text of instinfodata response
+    :return: SectionRecord object and None if payload is not complete or valid
+    """
+    values = _split_sections(payload)
+    if values is None:
+        return None
+
+    try:
+        numbers = _to_ints(values[2:])
+    except ValueError:
+        return None
+
+    return SectionRecord(values[0], values[1], *numbers)
+
+
+def parse_sections_batch(payloads):
+    """
+    This function will parse raw instinfodata payloads of a sweep to columns of section records. Payloads are
+    only split per namad, numbers of each column are converted with one numpy call for all namads.
+    :param payloads: list of raw texts of instinfodata responses
+    :return: tuple of numpy structured array of SECTION_DTYPE with one row per payload and boolean array,
+    False for payloads which are not complete or valid (their rows are zero)
+    """
+    split_payloads = [_split_sections(payload) for payload in payloads]
+    valid = np.array([values is not None for values in split_payloads], dtype=bool)
+    records = np.zeros(len(payloads), dtype=SECTION_DTYPE)
+    rows = [values for values in split_payloads if values is not None]
+    if not rows:
+        return records, valid
+
+    columns = np.array(rows, dtype=str).T
+    indexes = np.flatnonzero(valid)
+    numbers_valid = np.ones(len(rows), dtype=bool)
+    for field, column in zip(SECTION_DTYPE.names, columns):
+        if SECTION_DTYPE[field].kind == 'U':
+            records[field][indexes] = column
+            continue
+        records[field][indexes], column_valid = _to_int_column(column)
+        numbers_valid &= column_valid
+
+    valid[indexes] = numbers_valid
+    records[~valid] = np.zeros((), dtype=SECTION_DTYPE)
+    return records, valid
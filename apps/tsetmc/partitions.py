@@ -0,0 +1,147 @@
+import logging
+import re
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+
+from apps.namads.models import Namad
+from .models import NamadStat
+
+logger = logging.getLogger(__name__)
+
+TABLE = NamadStat._meta.db_table
+PARTITION_KEY = 'created_time'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_PATTERN = re.compile(rf'^{TABLE}_p(\d{{8}})$')
+
+
+def partition_name(day):
+    """
+    :param day: date of partition
+    :return: name of day's partition table, Ex: tsetmc_namadstats_p20201203
+    """
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def is_partitioned():
+    """
+    :return: True if NamadStat table is a partitioned table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions():
+    """
+    :return: dict of day and name of day partitions of NamadStat table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s",
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[date(int(match[1][:4]), int(match[1][4:6]), int(match[1][6:]))] = name
+    return partitions
+
+
+def create_partition(day):
+    """
+    This function will create partition of given day if it does not exist.
+    :param day: date of partition
+    :return: name of partition
+    """
+    name = partition_name(day)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+    return name
+
+
+def ensure_partitions(days_ahead=1, day=None):
+    """
+    This function will create partitions of given day and next days.
+    :param days_ahead: count of next days which their partitions should be created
+    :param day: first day, today if it is not set
+    :return: list of partition names
+    """
+    day = day or date.today()
+    return [create_partition(day + timedelta(days=i)) for i in range(days_ahead + 1)]
+
+
+def drop_partitions(before=None):
+    """
+    This function will detach and drop partitions of days before given day, it is a metadata-only
+    operation and the rows are not deleted one by one.
+    :param before: date, partitions of older days are dropped, all partitions are dropped if it is not set
+    :return: list of dropped partition names
+    """
+    dropped = []
+    for day, name in sorted(list_partitions().items()):
+        if before is not None and day >= before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+    return dropped
+
+
+def convert_to_partitioned(days_ahead=1):
+    """
+    This function will replace NamadStat table with a partitioned table by created time, current rows
+    are copied into day partitions. Primary key of partitioned table is (id, created_time).
+    :param days_ahead: count of next days which their partitions should be created
+    """
+    old_table = f'{TABLE}_unpartitioned'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old_table}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({PARTITION_KEY})"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, {PARTITION_KEY})")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_namad_id_fk FOREIGN KEY (namad_id) "
+            f"REFERENCES {Namad._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE INDEX {TABLE}_namad_id_idx ON {TABLE} (namad_id)")
+        # Sequence of id column is kept and should not be dropped with the old table
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"SELECT DISTINCT {PARTITION_KEY}::date FROM {old_table}")
+        days = {row[0] for row in cursor.fetchall()}
+        for day in sorted(days | set(date.today() + timedelta(days=i) for i in range(days_ahead + 1))):
+            create_partition(day)
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old_table}")
+        cursor.execute(f"DROP TABLE {old_table}")
+
+
+def rollover():
+    """
+    This function will remove all NamadStat rows at the end of day, partitions are dropped if the table
+    is partitioned and rows are deleted otherwise.
+    """
+    if not is_partitioned():
+        NamadStat.objects.all().delete()
+        return
+
+    dropped = drop_partitions()
+    with connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {DEFAULT_PARTITION}")
+    ensure_partitions()
+    logger.info(f"[NamadStat partitions are dropped]-[Partitions: {dropped}]")
@@ -0,0 +1,106 @@
+import time
+
+from conf import settings
+from utils.utils import redis_connection, redis_key
+
+SCHEDULE_TIMEOUT = 60 * 60 * 12
+# Beat ticks are not exact, namads which are due a few seconds later are polled in current sweep
+DUE_TOLERANCE = 5
+
+
+class PollScheduler:
+    """
+    Gives each namad its own poll interval, the next poll time of namads is kept in a redis sorted set
+    and their intervals and last trade counts in a redis hash.
+
+    - Namads with new trades are polled in every sweep (or after halving their interval).
+    - Namads which are locked in buy or sell queue are backed off until `locked_interval`.
+    - Namads without any change are backed off exponentially until `max_interval`.
+    """
+
+    def __init__(self, name='tsetmc:poll'):
+        self.schedule_key = redis_key(name, 'schedule')
+        self.state_key = redis_key(name, 'state')
+        self.min_interval = settings.TSETMC_POLL_MIN_INTERVAL
+        self.max_interval = settings.TSETMC_POLL_MAX_INTERVAL
+        self.locked_interval = settings.TSETMC_POLL_LOCKED_INTERVAL
+        self.active_trades = settings.TSETMC_POLL_ACTIVE_TRADES
+        self.backoff = settings.TSETMC_POLL_BACKOFF
+
+    def due(self, namad_keys, now=None):
+        """
+        :param namad_keys: list of namad keys
+        :param now: current timestamp (sweep start time)
+        :return: list of namad keys which should be polled, never scheduled namads are always due
+        """
+        now = now or time.time()
+        schedule = {k.decode(): score for k, score in redis_connection.zrange(self.schedule_key, 0, -1, withscores=True)}
+        return [k for k in namad_keys if schedule.get(k, 0) <= now + DUE_TOLERANCE]
+
+    def next_interval(self, interval, changed, trades=0, locked=False):
+        """
+        :param interval: current interval of namad
+        :param changed: determine if namad's data has changed since the last poll
+        :param trades: count of new trades since the last poll
+        :param locked: determine if namad is locked in buy or sell queue
+        :return: next interval in seconds
+        """
+        if locked:
+            return min(max(interval * self.backoff, self.min_interval), self.locked_interval)
+        if changed and trades >= self.active_trades:
+            return self.min_interval
+        if changed:
+            return max(interval / self.backoff, self.min_interval)
+        return min(interval * self.backoff, self.max_interval)
+
+    def reschedule(self, activities, now=None):
+        """
+        This function will compute and store next poll time of each polled namad.
+        :param activities: dict of namad key and its activity dict with `changed`, `tno` and `locked` keys,
+        activity is None for namads which could not be fetched, they are retried after `min_interval`
+        and their interval is kept
+        :param now: current timestamp (sweep start time)
+        """
+        if not activities:
+            return
+
+        now = now or time.time()
+        namad_keys = list(activities)
+        states = redis_connection.hmget(self.state_key, namad_keys)
+
+        schedule, new_states = {}, {}
+        for namad_key, state in zip(namad_keys, states):
+            interval, last_tno = self.min_interval, None
+            if state is not None:
+                interval, last_tno = state.decode().split(':')
+                interval, last_tno = float(interval), int(last_tno) if last_tno else None
+
+            activity = activities[namad_key]
+            if activity is None:
+                schedule[namad_key] = now + self.min_interval
+            else:
+                tno = activity.get('tno', last_tno)
+                trades = tno - last_tno if tno is not None and last_tno is not None else 0
+                interval = self.next_interval(interval, activity['changed'], trades, activity.get('locked', False))
+                last_tno = tno
+                schedule[namad_key] = now + interval
+            new_states[namad_key] = f"{interval}:{'' if last_tno is None else last_tno}"
+
+        pipeline = redis_connection.pipeline(transaction=False)
+        pipeline.zadd(self.schedule_key, schedule)
+        pipeline.hset(self.state_key, mapping=new_states)
+        pipeline.expire(self.schedule_key, SCHEDULE_TIMEOUT)
+        pipeline.expire(self.state_key, SCHEDULE_TIMEOUT)
+        pipeline.execute()
+
+
+def is_locked(record, today_namad):
+    """
+    :param record: SectionRecord of namad
+    :param today_namad: today's NamadDailyStat object of the namad
+    :return: True if namad is locked in buy queue (tmax without sellers) or sell queue (tmin without buyers)
+    """
+    return (record.pl == today_namad.tmax and not record.qo1) or (record.pl == today_namad.tmin and not record.qd1)
+
+
+poll_scheduler = PollScheduler()
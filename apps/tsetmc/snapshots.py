@@ -0,0 +1,216 @@
+import threading
+
+import numpy as np
+from django.db.models import Max
+from django.utils import timezone
+
+from utils.utils import redis_connection, redis_key
+from .models import NamadStat
+from .parsers import SECTION_DTYPE
+
+SNAPSHOT_TIMEOUT = 60 * 60 * 12
+
+# Fields of NamadStat which are not parsed from sections payload
+DERIVED_FIELDS = (
+    ('mv', np.int64),
+    ('plc', np.int64),
+    ('plp', np.float64),
+    ('pcc', np.int64),
+    ('pcp', np.float64),
+    ('tmax', np.int64),
+    ('tmin', np.int64),
+    ('floating_stock', np.float64),
+    ('total_transaction_average', np.float64),
+    ('stock_number', np.int64),
+    ('base_volume', np.int64),
+)
+SNAPSHOT_DTYPE = np.dtype(
+    [
+        ('namad_id', 'U24'),
+        ('name', 'U16'),
+        ('group_name', 'U40'),
+        ('created_time', np.float64),
+    ] + SECTION_DTYPE.descr + list(DERIVED_FIELDS)
+)
+# Schema version is a part of redis key, rows of an old schema are never read with a new dtype
+SNAPSHOT_VERSION = 1
+
+# Writes rows of namads and marks them by a new version of the store, so readers can find namads which are
+# changed after a version they have seen.
+# KEYS: rows, version, changes
+# ARGV: timeout, then namad id and row of each namad
+WRITE_SCRIPT = """
+local version = redis.call('INCR', KEYS[2])
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    redis.call('ZADD', KEYS[3], version, ARGV[i])
+end
+for _, key in ipairs(KEYS) do
+    redis.call('EXPIRE', key, ARGV[1])
+end
+return version
+"""
+
+
+def snapshot_row(namad_stat, name='', group_name='', created_time=None):
+    """
+    This function will make a snapshot row of a NamadStat object.
+    :param namad_stat: NamadStat object
+    :param name: name of namad
+    :param group_name: group name of namad
+    :param created_time: timestamp of the stat, now if it is not set
+    :return: numpy structured scalar of SNAPSHOT_DTYPE
+    """
+    row = np.zeros((), dtype=SNAPSHOT_DTYPE)
+    row['namad_id'] = namad_stat.namad_id
+    row['name'] = name or ''
+    row['group_name'] = group_name or ''
+    row['created_time'] = created_time or timezone.now().timestamp()
+    for field in SNAPSHOT_DTYPE.names[4:]:
+        row[field] = str(getattr(namad_stat, field)) if field == 'checksum_time' else getattr(namad_stat, field)
+    return row
+
+
+def snapshot_from_queryset(queryset):
+    """
+    This function will make a snapshot array of NamadStat queryset, Ex: for filling the store from database.
+    :param queryset: NamadStat queryset
+    :return: numpy structured array of SNAPSHOT_DTYPE
+    """
+    fields = SNAPSHOT_DTYPE.names[4:]
+    rows = queryset.values_list('namad_id', 'namad__name', 'namad__group_name', 'created_time', *fields)
+    return np.array(
+        [
+            (namad_id, name or '', group_name or '', created_time.timestamp(), str(checksum_time), *values)
+            for namad_id, name, group_name, created_time, checksum_time, *values in rows.iterator()
+        ],
+        dtype=SNAPSHOT_DTYPE
+    )
+
+
+def latest_stats_snapshot():
+    """
+    This function will read the latest stat of each namad from NamadStat with one query.
+    :return: numpy structured array of SNAPSHOT_DTYPE
+    """
+    last_stat = NamadStat.objects.values('namad_id').annotate(max_id=Max('id')).values('max_id')
+    return snapshot_from_queryset(NamadStat.objects.filter(id__in=last_stat).order_by('namad_id'))
+
+
+class LatestSnapshot:
+    """
+    Keeps the newest section row of each namad as a fixed-size binary record in a single redis hash,
+    so market-wide state can be loaded as a numpy structured array without querying NamadStat.
+    Rows are staged during a sweep and written with one request, each write increments the version of
+    the store and marks its namads by it in a sorted set of changes.
+    """
+
+    def __init__(self, name='tsetmc:snapshot', timeout=SNAPSHOT_TIMEOUT):
+        self.key = redis_key(name, f'v{SNAPSHOT_VERSION}')
+        self.version_key = redis_key(name, f'v{SNAPSHOT_VERSION}', 'version')
+        self.changes_key = redis_key(name, f'v{SNAPSHOT_VERSION}', 'changes')
+        self.timeout = timeout
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._write_script = redis_connection.register_script(WRITE_SCRIPT)
+
+    def _write(self, rows, client=None):
+        args = [self.timeout]
+        for namad_id, row in rows.items():
+            args.extend((namad_id, row))
+        return self._write_script(
+            keys=[self.key, self.version_key, self.changes_key], args=args, client=client
+        )
+
+    def stage(self, namad_stat, name='', group_name=''):
+        row = snapshot_row(namad_stat, name, group_name)
+        with self._lock:
+            self._rows[namad_stat.namad_id] = row.tobytes()
+
+    def flush(self):
+        """
+        This function will write staged rows to redis, older row of each namad is replaced in place.
+        :return: numpy structured array of written rows
+        """
+        with self._lock:
+            rows, self._rows = self._rows, {}
+
+        if not rows:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+
+        self._write(rows)
+        return np.frombuffer(b''.join(rows.values()), dtype=SNAPSHOT_DTYPE)
+
+    def load(self, namad_ids=None):
+        """
+        :param namad_ids: list of namad ids, all namads are loaded if it is not set
+        :return: numpy structured array of SNAPSHOT_DTYPE
+        """
+        if namad_ids is None:
+            rows = redis_connection.hvals(self.key)
+        else:
+            rows = [r for r in redis_connection.hmget(self.key, list(namad_ids)) if r is not None]
+        return np.frombuffer(b''.join(rows), dtype=SNAPSHOT_DTYPE)
+
+    def load_versioned(self):
+        """
+        This function will read whole rows and the version of the store in one transaction, so rows which are
+        written after the returned version are found by `changes` of it.
+        :return: tuple of version and numpy structured array of SNAPSHOT_DTYPE
+        """
+        pipeline = redis_connection.pipeline()
+        pipeline.get(self.version_key)
+        pipeline.hvals(self.key)
+        version, rows = pipeline.execute()
+        return int(version or 0), np.frombuffer(b''.join(rows), dtype=SNAPSHOT_DTYPE)
+
+    def version(self):
+        return int(redis_connection.get(self.version_key) or 0)
+
+    def changes(self, since_version=0):
+        """
+        :param since_version: version of the store which is seen by the reader
+        :return: tuple of current version and list of namad ids which are written after since_version
+        """
+        pipeline = redis_connection.pipeline()
+        pipeline.get(self.version_key)
+        pipeline.zrangebyscore(self.changes_key, f'({since_version}', '+inf')
+        version, namad_ids = pipeline.execute()
+        return int(version or 0), [namad_id.decode() for namad_id in namad_ids]
+
+    def replace(self, snapshot):
+        """
+        This function will replace whole store with given snapshot array.
+        :param snapshot: numpy structured array of SNAPSHOT_DTYPE
+        """
+        pipeline = redis_connection.pipeline()
+        pipeline.delete(self.key)
+        if len(snapshot):
+            self._write({row['namad_id']: row.tobytes() for row in snapshot}, client=pipeline)
+        pipeline.execute()
+
+    def rebuild(self):
+        """
+        This function will replace whole store with the latest stat of each namad in NamadStat,
+        Ex: after redis is flushed.
+        :return: numpy structured array of written rows
+        """
+        snapshot = latest_stats_snapshot()
+        self.replace(snapshot)
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._rows = {}
+        redis_connection.delete(self.key, self.version_key, self.changes_key)
+
+
+latest_snapshot = LatestSnapshot()
+
+
+def load_latest_snapshot(namad_ids=None):
+    """
+    :param namad_ids: list of namad ids, all namads are loaded if it is not set
+    :return: numpy structured array of newest section row of each namad
+    """
+    return latest_snapshot.load(namad_ids)
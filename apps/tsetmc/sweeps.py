@@ -0,0 +1,151 @@
+import json
+import time
+import uuid
+
+from conf import settings
+from utils.utils import redis_connection, redis_key
+
+# Sets fields of the state only if it still belongs to the given sweep, so a replaced sweep does not
+# overwrite state of the new one
+# KEYS: state
+# ARGV: sweep id, then field and value pairs
+UPDATE_SCRIPT = """
+if redis.call('hget', KEYS[1], 'sweep_id') ~= ARGV[1] then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('hset', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+# Sets fields of the state and stores the duration and counts only if the state still belongs to the given
+# sweep, then deletes the active sweep key only if it still belongs to the given sweep
+# KEYS: state, durations, counts, active
+# ARGV: sweep id, history size, duration, counts, then field and value pairs
+FINISH_SCRIPT = """
+local finished = 0
+if redis.call('hget', KEYS[1], 'sweep_id') == ARGV[1] then
+    for i = 5, #ARGV, 2 do
+        redis.call('hset', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('lpush', KEYS[2], ARGV[3])
+    redis.call('ltrim', KEYS[2], 0, tonumber(ARGV[2]) - 1)
+    redis.call('lpush', KEYS[3], ARGV[4])
+    redis.call('ltrim', KEYS[3], 0, tonumber(ARGV[2]) - 1)
+    finished = 1
+end
+if redis.call('get', KEYS[4]) == ARGV[1] then
+    redis.call('del', KEYS[4])
+end
+return finished
+"""
+
+
+class SweepCoordinator:
+    """
+    Tracks state of sections sweeps in redis, the active sweep id is kept in a key which expires after
+    `timeout` seconds (in case a worker dies in the middle of a sweep) and details of the last sweep
+    are kept in a hash. Durations and counts (Ex: processed and skipped namads) of finished sweeps are kept
+    in capped lists as metrics.
+    """
+
+    def __init__(self, name='tsetmc:sweep', timeout=None, history_size=100):
+        self.active_key = redis_key(name, 'active')
+        self.state_key = redis_key(name, 'state')
+        self.durations_key = redis_key(name, 'durations')
+        self.counts_key = redis_key(name, 'counts')
+        self.timeout = timeout or settings.TSETMC_SWEEP_TIMEOUT
+        self.history_size = history_size
+        self._update = redis_connection.register_script(UPDATE_SCRIPT)
+        self._finish = redis_connection.register_script(FINISH_SCRIPT)
+
+    def queue(self, force=False):
+        """
+        This function will register a new sweep if no other sweep is active.
+        :param force: determine if the new sweep should replace the active one
+        :return: id of the new sweep and None if another sweep is still active
+        """
+        sweep_id = uuid.uuid4().hex
+        if not redis_connection.set(self.active_key, sweep_id, ex=self.timeout, nx=not force):
+            return None
+
+        pipeline = redis_connection.pipeline(transaction=False)
+        pipeline.delete(self.state_key)
+        pipeline.hset(self.state_key, mapping={'sweep_id': sweep_id, 'status': 'queued', 'queued_at': time.time()})
+        pipeline.execute()
+        return sweep_id
+
+    def _update_state(self, sweep_id, **fields):
+        args = [sweep_id]
+        for field, value in fields.items():
+            args.extend((field, value))
+        return bool(self._update(keys=[self.state_key], args=args))
+
+    def start(self, sweep_id, expected):
+        return self._update_state(sweep_id, status='running', started_at=time.time(), expected=expected, completed=0)
+
+    def progress(self, sweep_id, completed):
+        """
+        This function will store count of namads which are completed so far in the running sweep.
+        :param sweep_id: id of the sweep
+        :param completed: count of completed namads
+        :return: False if the state belongs to another sweep
+        """
+        return self._update_state(sweep_id, completed=completed)
+
+    def finish(self, sweep_id, **counts):
+        """
+        This function will mark the sweep as finished and release the active sweep key. State and duration
+        are not stored if the sweep is replaced by another one meanwhile.
+        :param sweep_id: id of the sweep
+        :param counts: extra counts of the sweep which should be stored, Ex: processed=10
+        :return: False if the state belongs to another sweep
+        """
+        state = self.state()
+        finished_at = time.time()
+        duration = round(finished_at - float(state.get('started_at') or state.get('queued_at') or finished_at), 3)
+
+        args = [sweep_id, self.history_size, duration, json.dumps(counts)]
+        for field, value in {'status': 'finished', 'finished_at': finished_at, 'duration': duration, **counts}.items():
+            args.extend((field, value))
+        keys = [self.state_key, self.durations_key, self.counts_key, self.active_key]
+        return bool(self._finish(keys=keys, args=args))
+
+    def active(self):
+        """
+        :return: id of the active sweep and None if there is not any
+        """
+        sweep_id = redis_connection.get(self.active_key)
+        return sweep_id.decode() if sweep_id else None
+
+    def state(self):
+        return {k.decode(): v.decode() for k, v in redis_connection.hgetall(self.state_key).items()}
+
+    def metrics(self):
+        """
+        :return: dict of last sweep state, latency metrics and average counts of the last finished sweeps
+        """
+        state = self.state()
+        durations = [float(d) for d in redis_connection.lrange(self.durations_key, 0, -1)]
+        counts = [json.loads(c) for c in redis_connection.lrange(self.counts_key, 0, -1)]
+        queued_at, started_at = state.get('queued_at'), state.get('started_at')
+
+        return {
+            'active_sweep': self.active(),
+            'last_sweep': state,
+            'queue_delay': round(float(started_at) - float(queued_at), 3) if queued_at and started_at else None,
+            'sweeps_count': len(durations),
+            'avg_duration': round(sum(durations) / len(durations), 3) if durations else None,
+            'max_duration': max(durations) if durations else None,
+            'avg_processed': self._average(counts, 'processed'),
+            'avg_skipped': self._average(counts, 'skipped'),
+        }
+
+    @staticmethod
+    def _average(counts, name):
+        values = [c[name] for c in counts if name in c]
+        return round(sum(values) / len(values), 1) if values else None
+
+
+sweep_coordinator = SweepCoordinator()
@@ -1,3 +1,246 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from apps.tsetmc.buffers import NamadStatBuffer
+from apps.tsetmc.histories import append_price_volume_points
+from apps.tsetmc.parsers import SectionRecord, parse_sections, parse_sections_batch
+from apps.tsetmc.schedulers import PollScheduler
+from apps.tsetmc.tasks import flush_sections_data
+from apps.tsetmc.sweeps import SweepCoordinator
+from utils.utils import redis_connection
+
+
+SAMPLE_PAYLOAD = (
+    "12:29:59,A ,21480,20790,21490,20490,21490,19960,2596,4167003,86638155720,0,20201213,122959;"
+    "98/9/23 12:29:59,F,21480,<div class='pn'>20790</div>,21490,20490,21490,19960,2596,4167003,86638155720,0,20201213,122959;"
+    "11@607804@20640@20680@17607@4,4@7454@20630@20710@366@1,6@7629@20620@20750@15619@2,;"
+    "20490,20790,;"
+    "3935979,226843,,4050322,112500,1346,2,,788,1,;"
+    ";;;"
+)
+SAMPLE_SECTIONS = {
+    'checksum_time': '12:29:59', 'status': 'A', 'pl': 21480, 'pc': 20790, 'pf': 21490, 'py': 20490,
+    'pmax': 21490, 'pmin': 19960, 'tno': 2596, 'tvol': 4167003, 'tval': 86638155720,
+    'zd1': 11, 'qd1': 607804, 'pd1': 20640, 'po1': 20680, 'qo1': 17607, 'zo1': 4,
+    'zd2': 4, 'qd2': 7454, 'pd2': 20630, 'po2': 20710, 'qo2': 366, 'zo2': 1,
+    'zd3': 6, 'qd3': 7629, 'pd3': 20620, 'po3': 20750, 'qo3': 15619, 'zo3': 2,
+    'buy_i_volume': 3935979, 'buy_n_volume': 226843, 'sell_i_volume': 4050322, 'sell_n_volume': 112500,
+    'buy_counti': 1346, 'buy_countn': 2, 'sell_counti': 788, 'sell_countn': 1,
+}
+
+
+class SectionsParserTestCase(SimpleTestCase):
+    def test_parse_sections(self):
+        record = parse_sections(SAMPLE_PAYLOAD)
+        self.assertDictEqual(record._asdict(), SAMPLE_SECTIONS)
+
+    def test_parse_incomplete_sections(self):
+        self.assertIsNone(parse_sections(''))
+        self.assertIsNone(parse_sections(SAMPLE_PAYLOAD.replace(',6@7629@20620@20750@15619@2', '')))
+        self.assertIsNone(parse_sections(SAMPLE_PAYLOAD.replace('3935979,', ',')))
+
+    def test_parse_sections_batch(self):
+        payloads = [
+            SAMPLE_PAYLOAD,
+            '',
+            SAMPLE_PAYLOAD.replace('21480', '21480.0', 1),
+            SAMPLE_PAYLOAD.replace('3935979,', ','),
+            SAMPLE_PAYLOAD.replace('607804', 'x'),
+        ]
+        records, valid = parse_sections_batch(payloads)
+
+        self.assertListEqual(valid.tolist(), [True, False, True, False, False])
+        for payload, row, is_valid in zip(payloads, records, valid):
+            if is_valid:
+                self.assertEqual(SectionRecord(*row.item()), parse_sections(payload))
+        self.assertDictEqual(SectionRecord(*records[0].item())._asdict(), SAMPLE_SECTIONS)
+
+
+class FlushSectionsDataTestCase(SimpleTestCase):
+    @mock.patch('apps.tsetmc.tasks.namad_chart_cache')
+    @mock.patch('apps.tsetmc.tasks.latest_snapshot')
+    @mock.patch('apps.tsetmc.tasks.namad_stat_buffer')
+    def test_failed_step(self, stat_buffer, snapshot, chart_cache):
+        snapshot.flush.side_effect = RuntimeError('redis is down')
+
+        self.assertFalse(flush_sections_data('sweep'))
+        stat_buffer.flush.assert_called_once()
+        chart_cache.flush.assert_called_once()
+
+
+@mock.patch('apps.tsetmc.histories.history_price_volume_graphs')
+@mock.patch('apps.tsetmc.histories.namad_chart_cache')
+class PriceVolumeGraphTestCase(SimpleTestCase):
+    def test_append_points(self, chart_cache, history_graphs):
+        today, yesterday = date.today(), date.today() - timedelta(days=1)
+        chart_cache.get_fields.return_value = {
+            'cached': [(yesterday.toordinal(), 100, 10)],
+            'missing': None,
+            'old_format': [('1399-09-22', 100, 10)],
+        }
+        history_graphs.return_value = {
+            'missing': [(yesterday.toordinal(), 200, 20), (today.toordinal(), 210, 21)],
+        }
+
+        self.assertEqual(append_price_volume_points([
+            ('cached', today, 110, 11), ('missing', today, 210, 21), ('old_format', today, 310, 31)
+        ]), 3)
+        # Only graphs which are not cached in the current format are built from histories
+        history_graphs.assert_called_once_with(['missing', 'old_format'], 365)
+        graphs = {k: v['daily']['price_volume_graph'] for k, v in chart_cache.write.call_args.args[0].items()}
+        self.assertDictEqual(graphs, {
+            'cached': [(yesterday.toordinal(), 100, 10), (today.toordinal(), 110, 11)],
+            'missing': [(yesterday.toordinal(), 200, 20), (today.toordinal(), 210, 21)],
+            'old_format': [(today.toordinal(), 310, 31)],
+        })
+
+
+@mock.patch('apps.tsetmc.buffers.transaction')
+@mock.patch('apps.tsetmc.buffers.NamadStat')
+class NamadStatBufferTestCase(SimpleTestCase):
+    def test_failed_flush(self, namad_stat, transaction):
+        buffer = NamadStatBuffer(flush_size=10, flush_interval=60)
+        buffer.add('first')
+        namad_stat.objects.bulk_create.side_effect = RuntimeError('database is down')
+
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        buffer.add('second')
+        self.assertEqual(len(buffer), 2)
+
+        namad_stat.objects.bulk_create.side_effect = None
+        self.assertEqual(buffer.flush(), 2)
+        namad_stat.objects.bulk_create.assert_called_with(['first', 'second'], batch_size=10)
+
+    @mock.patch('apps.tsetmc.buffers.time')
+    def test_flush_interval(self, time, namad_stat, transaction):
+        buffer = NamadStatBuffer(flush_size=10, flush_interval=60)
+        time.monotonic.return_value = 1000
+        buffer.add('first')
+        # Interval is measured from the oldest buffered row, not from the last flush
+        time.monotonic.return_value = 1059
+        buffer.add('second')
+        namad_stat.objects.bulk_create.assert_not_called()
+
+        time.monotonic.return_value = 1060
+        buffer.add('third')
+        namad_stat.objects.bulk_create.assert_called_once_with(['first', 'second', 'third'], batch_size=10)
+
+
+class PollSchedulerTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.scheduler = PollScheduler(name='test:poll')
+        self.scheduler.min_interval, self.scheduler.max_interval = 60, 600
+        self.scheduler.locked_interval, self.scheduler.active_trades, self.scheduler.backoff = 300, 20, 2
+        self.cleanup()
+        self.addCleanup(self.cleanup)
+
+    def cleanup(self):
+        redis_connection.delete(self.scheduler.schedule_key, self.scheduler.state_key)
+
+    def intervals(self, activities, now=1000):
+        """
+        :return: list of intervals of namad after each activity
+        """
+        intervals = []
+        for activity in activities:
+            self.scheduler.reschedule({'namad': activity}, now)
+            intervals.append(redis_connection.zscore(self.scheduler.schedule_key, 'namad') - now)
+        return intervals
+
+    def test_backoff(self):
+        unchanged = {'changed': False}
+        self.assertListEqual(self.intervals([unchanged] * 5), [120, 240, 480, 600, 600])
+
+    def test_halving(self):
+        self.intervals([{'changed': False}] * 4)
+        changed = [{'changed': True, 'tno': tno} for tno in (10, 15, 20, 25, 30)]
+        self.assertListEqual(self.intervals(changed), [300, 150, 75, 60, 60])
+
+    def test_active_trades(self):
+        self.intervals([{'changed': False, 'tno': 10}] * 4)
+        self.assertListEqual(self.intervals([{'changed': True, 'tno': 30}]), [60])
+
+    def test_locked_interval(self):
+        locked = {'changed': True, 'locked': True}
+        self.assertListEqual(self.intervals([locked] * 4), [120, 240, 300, 300])
+        self.intervals([{'changed': False}] * 3)
+        self.assertListEqual(self.intervals([locked]), [300])
+
+    def test_failed_fetch(self):
+        self.intervals([{'changed': False}] * 2)
+        # Failed fetches are retried soon without changing the interval of namad
+        self.assertListEqual(self.intervals([None, None]), [60, 60])
+        self.assertListEqual(self.intervals([{'changed': False}]), [480])
+
+    def test_due(self):
+        self.assertListEqual(self.scheduler.due(['namad', 'other'], 1000), ['namad', 'other'])
+        self.scheduler.reschedule({'namad': {'changed': False}}, 1000)
+        self.assertListEqual(self.scheduler.due(['namad', 'other'], 1100), ['other'])
+        self.assertListEqual(self.scheduler.due(['namad', 'other'], 1120), ['namad', 'other'])
+
+
+class SweepCoordinatorTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.coordinator = SweepCoordinator(name='test:sweep', timeout=600)
+        self.cleanup()
+        self.addCleanup(self.cleanup)
+
+    def cleanup(self):
+        redis_connection.delete(
+            self.coordinator.active_key, self.coordinator.state_key, self.coordinator.durations_key,
+            self.coordinator.counts_key
+        )
+
+    def test_overlap(self):
+        sweep_id = self.coordinator.queue()
+        self.assertIsNotNone(sweep_id)
+        self.assertIsNone(self.coordinator.queue())
+        self.assertEqual(self.coordinator.active(), sweep_id)
+        self.assertLessEqual(redis_connection.ttl(self.coordinator.active_key), 600)
+
+        self.coordinator.start(sweep_id, expected=10)
+        self.coordinator.finish(sweep_id, processed=10)
+        self.assertIsNone(self.coordinator.active())
+        self.assertEqual(self.coordinator.state()['status'], 'finished')
+        self.assertEqual(self.coordinator.metrics()['sweeps_count'], 1)
+        self.assertIsNotNone(self.coordinator.queue())
+
+    def test_counts(self):
+        for processed, skipped in ((10, 90), (30, 70)):
+            sweep_id = self.coordinator.queue()
+            self.coordinator.start(sweep_id, expected=100)
+            self.coordinator.finish(sweep_id, processed=processed, skipped=skipped)
+
+        metrics = self.coordinator.metrics()
+        self.assertEqual((metrics['avg_processed'], metrics['avg_skipped']), (20, 80))
+        self.assertEqual(metrics['last_sweep']['skipped'], '70')
+
+    def test_release_of_replaced_sweep(self):
+        old_sweep_id = self.coordinator.queue()
+        new_sweep_id = self.coordinator.queue(force=True)
+        self.assertNotEqual(old_sweep_id, new_sweep_id)
+
+        # A sweep which is replaced does not release the active key or overwrite the state of the new one
+        self.coordinator.start(new_sweep_id, expected=10)
+        self.assertFalse(self.coordinator.start(old_sweep_id, expected=5))
+        self.assertFalse(self.coordinator.finish(old_sweep_id, processed=5))
+        self.assertEqual(self.coordinator.active(), new_sweep_id)
+        state = self.coordinator.state()
+        self.assertEqual((state['sweep_id'], state['status'], state['expected']), (new_sweep_id, 'running', '10'))
+        self.assertEqual(self.coordinator.metrics()['sweeps_count'], 0)
+
+        self.assertTrue(self.coordinator.finish(new_sweep_id))
+        self.assertIsNone(self.coordinator.active())
+        self.assertEqual(self.coordinator.metrics()['sweeps_count'], 1)
+
+    def test_progress(self):
+        sweep_id = self.coordinator.queue()
+        self.coordinator.start(sweep_id, expected=100)
+        self.assertTrue(self.coordinator.progress(sweep_id, 50))
+        self.assertEqual(self.coordinator.state()['completed'], '50')
+
+        self.assertFalse(self.coordinator.progress('another sweep', 60))
+        self.assertEqual(self.coordinator.state()['completed'], '50')
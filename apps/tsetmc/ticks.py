@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import numpy as np
+from django.db import connection
+
+from .models import NamadStat
+from .snapshots import SNAPSHOT_DTYPE
+
+# Numeric columns of snapshot rows can be read as ticks
+TICK_COLUMNS = {
+    name: SNAPSHOT_DTYPE.fields[name][0] for name in SNAPSHOT_DTYPE.names if SNAPSHOT_DTYPE.fields[name][0].kind in 'if'
+}
+
+# Last rows of each namad which has at least `count` rows after `since`, newest first
+LAST_STATS_SQL = """
+SELECT namad_id, {columns} FROM (
+    SELECT
+        namad_id, {columns},
+        ROW_NUMBER() OVER (PARTITION BY namad_id ORDER BY id DESC) AS tick_index,
+        COUNT(*) OVER (PARTITION BY namad_id) AS stats_count
+    FROM {table}
+    WHERE created_time >= %(since)s
+) last_stats
+WHERE tick_index <= %(count)s AND stats_count >= %(count)s
+ORDER BY namad_id, tick_index
+"""
+
+
+def last_stat_ticks(columns, count=2, since=None):
+    """
+    This function will find the last stats of each namad from NamadStat with one window query instead of
+    one query per namad.
+    :param columns: names of tick columns which should be returned
+    :param count: count of last stats of each namad
+    :param since: timestamp, only namads which have at least `count` stats after it are returned
+    :return: tuple of namad ids and dict of column name and array of shape (namads, count),
+    stats of each namad are ordered from newest to oldest
+    """
+    db_columns = [c for c in columns if c != 'created_time']
+    sql = LAST_STATS_SQL.format(
+        columns=', '.join(['created_time', *db_columns]),
+        table=NamadStat._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'since': datetime.fromtimestamp(since or 0), 'count': count})
+        rows = cursor.fetchall()
+
+    namad_ids = [row[0] for row in rows[::count]]
+    values = [(row[1].timestamp(), *row[2:]) for row in rows]
+    ticks = {
+        column: np.array([v[i] for v in values], dtype=TICK_COLUMNS[column]).reshape(-1, count)
+        for i, column in enumerate(['created_time', *db_columns])
+    }
+    return namad_ids, {column: ticks[column] for column in columns}
@@ -1,6 +1,5 @@
 import logging
 import os
-import re
 from logging.handlers import RotatingFileHandler
 
 from pid import PidFile
@@ -44,18 +43,56 @@ def close_running(file_lock):
     file_lock.close()
 
 
-def extract_script_values(parsed_html, namad_key, func_name, logger):
+class TopInstScanner:
+    """
+    Finds the script block of namad page which contains `TopInst` in a streamed response, chunks are
+    scanned as bytes and the rest of page is not needed after the block is found.
+    """
+    MARKER = b'TopInst'
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = None
+        self.script = None
+
+    def feed(self, chunk):
+        """
+        :param chunk: next bytes chunk of response
+        :return: True if the script block is found and the rest of response is not needed
+        """
+        if self.script is not None:
+            return True
+
+        self.buffer += chunk
+        if self.start is None:
+            marker_index = self.buffer.find(self.MARKER)
+            if marker_index == -1:
+                # Only the part after the last tag is needed to find start of the script block
+                last_tag = self.buffer.rfind(b'>')
+                if last_tag > 0:
+                    del self.buffer[:last_tag]
+                return False
+            self.start = self.buffer.rfind(b'>', 0, marker_index) + 1
+
+        end = self.buffer.find(b'</', self.start)
+        if end == -1:
+            return False
+
+        self.script = self.buffer[self.start:end].decode('utf-8', errors='ignore')
+        self.buffer = bytearray()
+        return True
+
+
+def extract_script_values(script, namad_key, func_name, logger):
     """
     This function will extract script values based on namad page and returns this values as dict.
-    :param parsed_html: parsed html body of soup type
+    :param script: text of script block which contains TopInst, Ex: found by TopInstScanner
     :param namad_key: number of specific namad
     :param func_name: name of function for logging
     :param logger: logger object of logging
     :return: script dict after job is done and False if any exceptions occurs
     """
-    script = str(parsed_html.find(
-        string=re.compile("TopInst"))
-    ).replace('var ', '').replace(';', '').split(',')
+    script = str(script).replace('var ', '').replace(';', '').split(',')
 
     script_dict = {}
     try:
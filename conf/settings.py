@@ -147,8 +147,25 @@ INSERT_SECTIONS_CRONTAB = ast.literal_eval(config('INSERT_SECTIONS_CRONTAB'))
 INSERT_NAMAD_DAILY_CRONTAB = ast.literal_eval(config('INSERT_NAMAD_DAILY_CRONTAB'))
 INSERT_LAST_HISTORY_CRONTAB = ast.literal_eval(config('INSERT_LAST_HISTORY_CRONTAB'))
 CHECK_NAMAD_STATUS_CRONTAB = ast.literal_eval(config('CHECK_NAMAD_STATUS_CRONTAB'))
+CREATE_PARTITIONS_CRONTAB = ast.literal_eval(config('CREATE_PARTITIONS_CRONTAB', default="{'hour': '0', 'minute': '30'}"))
 TSETMC_CONNECTION_READ_TIMEOUT = config('TSETMC_CONNECTION_READ_TIMEOUT', default=6, cast=int)
 TSETMC_CONNECTION_CONNECT_TIMEOUT = config('TSETMC_CONNECTION_CONNECT_TIMEOUT', default=3, cast=int)
+TSETMC_CONNECTION_POOL_SIZE = config('TSETMC_CONNECTION_POOL_SIZE', default=20, cast=int)
+TSETMC_CONNECTION_RETRIES = config('TSETMC_CONNECTION_RETRIES', default=2, cast=int)
+TSETMC_CONNECTION_BACKOFF_FACTOR = config('TSETMC_CONNECTION_BACKOFF_FACTOR', default=0.3, cast=float)
+TSETMC_SECTIONS_CONCURRENCY = config('TSETMC_SECTIONS_CONCURRENCY', default=20, cast=int)
+TSETMC_DAILY_CONCURRENCY = config('TSETMC_DAILY_CONCURRENCY', default=10, cast=int)
+TSETMC_POLL_MIN_INTERVAL = config('TSETMC_POLL_MIN_INTERVAL', default=60, cast=int)
+TSETMC_POLL_MAX_INTERVAL = config('TSETMC_POLL_MAX_INTERVAL', default=600, cast=int)
+TSETMC_POLL_LOCKED_INTERVAL = config('TSETMC_POLL_LOCKED_INTERVAL', default=300, cast=int)
+TSETMC_POLL_ACTIVE_TRADES = config('TSETMC_POLL_ACTIVE_TRADES', default=20, cast=int)
+TSETMC_POLL_BACKOFF = config('TSETMC_POLL_BACKOFF', default=2, cast=float)
+TSETMC_SWEEP_TIMEOUT = config('TSETMC_SWEEP_TIMEOUT', default=600, cast=int)
+TSETMC_STAT_FLUSH_SIZE = config('TSETMC_STAT_FLUSH_SIZE', default=500, cast=int)
+TSETMC_STAT_FLUSH_INTERVAL = config('TSETMC_STAT_FLUSH_INTERVAL', default=60, cast=int)
+NAMADSTAT_PARTITIONS_AHEAD = config('NAMADSTAT_PARTITIONS_AHEAD', default=1, cast=int)
+FILTERS_INCREMENTAL = config('FILTERS_INCREMENTAL', default=True, cast=bool)
+FILTERS_MIN_INTERVAL = config('FILTERS_MIN_INTERVAL', default=10, cast=int)
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
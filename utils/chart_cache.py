@@ -0,0 +1,411 @@
+import json
+import sys
+import threading
+from collections import defaultdict
+
+import msgpack
+
+from utils.utils import redis_connection, redis_key
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Parts of namad's chart data, each part is a redis hash and its fields are stored separately
+CHART_PARTS = ('daily', 'sections')
+# Series of sections which are appended on each sweep, they are kept in redis sorted sets by time
+APPENDABLE_SERIES = {
+    'sections': ('money_entry_graph',),
+}
+# Bucket size of each resolution of series in milliseconds, the last point of each bucket is kept
+SERIES_RESOLUTIONS = {
+    'raw': 0,
+    '1m': 60 * 1000,
+    '5m': 5 * 60 * 1000,
+}
+# Raw points which are older than this many milliseconds before the last point are dropped
+RAW_WINDOW = 30 * 60 * 1000
+# Resolution of each window of series when no resolution is requested, from the last point backwards
+COMPOSITE_WINDOWS = (
+    ('raw', RAW_WINDOW),
+    ('1m', 2 * 60 * 60 * 1000),
+    ('5m', None),
+)
+# First byte of each encoded value is the version of its encoding
+MSGPACK_VERSION = b'\x01'
+MSGPACK_ZSTD_VERSION = b'\x02'
+# Values smaller than this many bytes are not compressed
+COMPRESS_THRESHOLD = 512
+# Rendered JSON of namad is rebuilt after this many seconds even if it is not invalidated
+JSON_TIMEOUT = 60
+# Count of the last series points which their versions are kept for `get_changes`
+MAX_POINT_MARKS = 1000
+
+# Writes fields of namad which their values are changed, version of namad is incremented if any field
+# is changed or any point is added and changed fields and added points are marked by the new version.
+# KEYS: version, changes, marks, reset, hash of each part
+# ARGV: max marks, reset, count of marks, marks..., then for each part: name, count of fields, field, value, ...
+WRITE_SCRIPT = """
+local max_marks, reset, marks_count = tonumber(ARGV[1]), ARGV[2] == '1', tonumber(ARGV[3])
+local changed = {}
+local i = marks_count + 4
+for k = 5, #KEYS do
+    local part, fields_count = ARGV[i], tonumber(ARGV[i + 1])
+    for j = i + 2, i + fields_count * 2, 2 do
+        if redis.call('HGET', KEYS[k], ARGV[j]) ~= ARGV[j + 1] then
+            redis.call('HSET', KEYS[k], ARGV[j], ARGV[j + 1])
+            changed[#changed + 1] = part .. ':' .. ARGV[j]
+        end
+    end
+    i = i + 2 + fields_count * 2
+end
+if #changed == 0 and marks_count == 0 and not reset then
+    return tonumber(redis.call('GET', KEYS[1]) or 0)
+end
+
+local version = redis.call('INCR', KEYS[1])
+if reset then
+    redis.call('DEL', KEYS[3])
+    redis.call('SET', KEYS[4], version)
+end
+for _, field in ipairs(changed) do
+    redis.call('ZADD', KEYS[2], version, field)
+end
+for j = 4, marks_count + 3 do
+    redis.call('ZADD', KEYS[3], version, ARGV[j])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -max_marks - 1)
+return version
+"""
+
+
+def dump_json(value):
+    """
+    :return: compact JSON bytes of value
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def encode(value):
+    """
+    This function will encode a value of chart cache with msgpack, large values are compressed
+    with zstd if `zstandard` is installed.
+    :param value: raw value, Ex: list of points
+    :return: encoded bytes with a leading version byte
+    """
+    packed = msgpack.packb(value, use_bin_type=True)
+    if zstandard is not None and len(packed) > COMPRESS_THRESHOLD:
+        return MSGPACK_ZSTD_VERSION + zstandard.ZstdCompressor().compress(packed)
+    return MSGPACK_VERSION + packed
+
+
+def decode(value):
+    version, packed = value[:1], value[1:]
+    if version == MSGPACK_ZSTD_VERSION:
+        packed = zstandard.ZstdDecompressor().decompress(packed)
+    elif version != MSGPACK_VERSION:
+        raise ValueError(f"Unknown chart cache encoding version: {version}")
+    return msgpack.unpackb(packed, raw=False)
+
+
+def compose_series(points):
+    """
+    This function will compose points of a series from its resolutions, windows of `COMPOSITE_WINDOWS`
+    are filled from the last point backwards and each window starts before the first point of the finer one.
+    :param points: dict of resolution and its points sorted by time
+    :return: list of points sorted by time
+    """
+    latest = max((p[-1][0] for p in points.values() if p), default=None)
+    if latest is None:
+        return []
+
+    windows = []
+    end = float('inf')
+    for resolution, window in COMPOSITE_WINDOWS:
+        start = latest - window if window else float('-inf')
+        window_points = [p for p in points.get(resolution, ()) if start <= p[0] < end]
+        if window_points:
+            end = window_points[0][0]
+        windows.append(window_points)
+    return [p for window_points in reversed(windows) for p in window_points]
+
+
+class NamadChartCache:
+    """
+    Keeps chart data of each namad in redis with one hash per part (`daily`, `sections`) and sorted sets of
+    appendable series (`money_entry_graph`) in several resolutions. Fields are written with HSET and points are
+    added with ZADD, so updates do not read and rewrite the whole data of namad and concurrent writers do not
+    lose updates.
+    Updates of many namads are written with one pipelined request by `write` or `stage` and `flush`.
+
+    Layout:
+        <prefix>:chart:<namad_id>:daily              hash of daily fields
+        <prefix>:chart:<namad_id>:sections           hash of sections fields, Ex: order_status_table
+        <prefix>:chart:<namad_id>:money_entry_graph:<resolution>  money entry points scored by time, raw
+                                                                  points of the last 30 minutes and the
+                                                                  last point of each 1m and 5m bucket
+        <prefix>:chart:<namad_id>:json               rendered JSON of chart data and its version
+        <prefix>:chart:<namad_id>:version            version of chart data, it is incremented on each write
+        <prefix>:chart:<namad_id>:changes            changed fields (<part>:<field>) scored by their last version
+        <prefix>:chart:<namad_id>:marks              added points (<series>:<time>) scored by their version
+        <prefix>:chart:<namad_id>:reset              version of the last clear of series
+
+    Raw values are stored (Ex: volumes are not formatted) and they are encoded by `encode`.
+    Fields are written only if their values are changed. Each write is applied with its version in one
+    transaction, so readers see data and version together.
+    """
+
+    def __init__(self, name='chart'):
+        self.name = name
+        self._staged = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._write_script = redis_connection.register_script(WRITE_SCRIPT)
+
+    def key(self, namad_id, part):
+        return redis_key(self.name, namad_id, part)
+
+    def series_key(self, namad_id, series, resolution):
+        return redis_key(self.name, namad_id, series, resolution)
+
+    def _series_keys(self, namad_id):
+        keys = []
+        for part in CHART_PARTS:
+            for series in APPENDABLE_SERIES.get(part, ()):
+                # The bare key is the list of series in the older layout
+                keys.append(self.key(namad_id, series))
+                keys.extend(self.series_key(namad_id, series, resolution) for resolution in SERIES_RESOLUTIONS)
+        return keys
+
+    def _add_point(self, pipeline, namad_id, series, point):
+        timestamp = point[0]
+        member = encode(point)
+        for resolution, size in SERIES_RESOLUTIONS.items():
+            key = self.series_key(namad_id, series, resolution)
+            if size:
+                # Point of the bucket is replaced by its last point
+                score = timestamp - timestamp % size
+                pipeline.zremrangebyscore(key, score, score)
+            else:
+                score = timestamp
+                pipeline.zremrangebyscore(key, '-inf', f'({timestamp - RAW_WINDOW}')
+            pipeline.zadd(key, {member: score})
+
+    def _write(self, pipeline, namad_id, parts, reset=False):
+        keys = [self.key(namad_id, k) for k in ('version', 'changes', 'marks', 'reset')]
+        marks, fields = [], []
+        for part, data in parts.items():
+            data = dict(data)
+            for series in APPENDABLE_SERIES.get(part, ()):
+                if series in data:
+                    point = data.pop(series)
+                    self._add_point(pipeline, namad_id, series, point)
+                    marks.append(f'{series}:{point[0]}')
+            if data:
+                keys.append(self.key(namad_id, part))
+                fields.extend((part, len(data), *(x for k, v in data.items() for x in (k, encode(v)))))
+        self._write_script(keys=keys, args=[MAX_POINT_MARKS, int(reset), len(marks), *marks, *fields], client=pipeline)
+
+    def write(self, updates, clear=()):
+        """
+        This function will apply updates of many namads with one pipelined transaction, version of
+        each namad is incremented if any of its fields is changed or any point is added.
+        :param updates: dict of namad id and dict of its parts' fields, Ex: {namad_id: {'sections': {...}}},
+        appendable series should be a single new point which its first item is its time in milliseconds
+        :param clear: list of namad ids which their appendable series should be cleared before updates
+        """
+        if not updates and not clear:
+            return
+
+        pipeline = redis_connection.pipeline()
+        series_keys = [key for namad_id in clear for key in self._series_keys(namad_id)]
+        # Rendered JSON of updated namads is not valid anymore
+        pipeline.delete(*series_keys, *[self.key(namad_id, 'json') for namad_id in {*updates, *clear}])
+        for namad_id in {*updates, *clear}:
+            self._write(pipeline, namad_id, updates.get(namad_id, {}), reset=namad_id in clear)
+        pipeline.execute()
+
+    def update(self, namad_id, part, data):
+        """
+        This function will update fields of a part of namad's chart data.
+        :param namad_id: id of specific namad
+        :param part: part of namad's chart data, Ex: 'sections'
+        :param data: dict of fields, appendable series should be a single new point
+        """
+        self.write({namad_id: {part: data}})
+
+    def stage(self, namad_id, part, data):
+        """
+        This function will keep an update until the next `flush`, Ex: during a sections sweep.
+        """
+        with self._lock:
+            self._staged[namad_id][part] = data
+
+    def flush(self):
+        """
+        This function will write all staged updates with one pipelined request.
+        :return: count of updated namads
+        """
+        with self._lock:
+            staged, self._staged = self._staged, defaultdict(dict)
+        self.write(staged)
+        return len(staged)
+
+    def get_fields(self, namad_ids, part, field, default=None):
+        """
+        :param namad_ids: list of namad ids
+        :param part: part of namads' chart data
+        :param field: name of field
+        :param default: value of field for namads which do not have it
+        :return: dict of namad id and value of its field
+        """
+        pipeline = redis_connection.pipeline(transaction=False)
+        for namad_id in namad_ids:
+            pipeline.hget(self.key(namad_id, part), field)
+        return {
+            namad_id: default if value is None else decode(value)
+            for namad_id, value in zip(namad_ids, pipeline.execute())
+        }
+
+    def get_version(self, namad_id):
+        """
+        :param namad_id: id of specific namad
+        :return: version of namad's chart data, 0 if it is not written yet
+        """
+        return int(redis_connection.get(self.key(namad_id, 'version')) or 0)
+
+    def get(self, namad_id, resolution=None, since=None, with_version=False):
+        """
+        :param namad_id: id of specific namad
+        :param resolution: resolution of series, Ex: '1m', series are composed of all resolutions if it is not set
+        :param since: time in milliseconds, only points after it are returned if it is set
+        :param with_version: if True, version of data is returned too
+        :return: dict of namad's chart data, Ex: {'daily': {...}, 'sections': {..., 'money_entry_graph': [...]}},
+        tuple of version and chart data if `with_version` is True
+        """
+        resolutions = [resolution] if resolution else list(SERIES_RESOLUTIONS)
+        pipeline = redis_connection.pipeline()
+        pipeline.get(self.key(namad_id, 'version'))
+        for part in CHART_PARTS:
+            pipeline.hgetall(self.key(namad_id, part))
+            for series in APPENDABLE_SERIES.get(part, ()):
+                for r in resolutions:
+                    # Bucket of a point is scored by its start, so the bucket which contains `since` is read too
+                    start = '-inf' if since is None else since - SERIES_RESOLUTIONS[r]
+                    pipeline.zrangebyscore(self.series_key(namad_id, series, r), start, '+inf')
+        results = iter(pipeline.execute())
+        version = int(next(results) or 0)
+
+        chart_data = {}
+        for part in CHART_PARTS:
+            part_data = {k.decode(): decode(v) for k, v in next(results).items()}
+            for series in APPENDABLE_SERIES.get(part, ()):
+                points = {
+                    r: [p for p in map(decode, next(results)) if since is None or p[0] > since]
+                    for r in resolutions
+                }
+                points = points[resolution] if resolution else compose_series(points)
+                if points or part_data:
+                    part_data[series] = points
+            if part_data:
+                chart_data[part] = part_data
+        return (version, chart_data) if with_version else chart_data
+
+    def get_changes(self, namad_id, since_version, resolution=None):
+        """
+        This function will return data of namad which is changed after given version. Whole data is returned
+        if changes can not be found, Ex: series are cleared or marks of points are dropped after that version.
+        Data may be newer than the returned version if it is written in between, applying it again is harmless.
+        :param namad_id: id of specific namad
+        :param since_version: version of data which client has
+        :param resolution: resolution of series, see `get`
+        :return: tuple of version, True if whole data is returned, chart data and dict of changed fields of
+        each part (None if whole data is returned)
+        """
+        pipeline = redis_connection.pipeline()
+        pipeline.get(self.key(namad_id, 'version'))
+        pipeline.get(self.key(namad_id, 'reset'))
+        pipeline.zrangebyscore(self.key(namad_id, 'changes'), f'({since_version}', '+inf')
+        pipeline.zrangebyscore(self.key(namad_id, 'marks'), f'({since_version}', '+inf')
+        pipeline.zcard(self.key(namad_id, 'marks'))
+        pipeline.zrange(self.key(namad_id, 'marks'), 0, 0, withscores=True)
+        version, reset, fields, marks, marks_count, oldest_mark = pipeline.execute()
+        version = int(version or 0)
+
+        if (
+                since_version > version or since_version < int(reset or 0)
+                or (marks_count >= MAX_POINT_MARKS and oldest_mark and oldest_mark[0][1] > since_version)
+        ):
+            version, chart_data = self.get(namad_id, resolution=resolution, with_version=True)
+            return version, True, chart_data, None
+
+        changed = defaultdict(set)
+        for field in fields:
+            part, name = field.decode().split(':', 1)
+            changed[part].add(name)
+        series_parts = {series: part for part in CHART_PARTS for series in APPENDABLE_SERIES.get(part, ())}
+        timestamps = []
+        for mark in marks:
+            series, timestamp = mark.decode().rsplit(':', 1)
+            changed[series_parts[series]].add(series)
+            timestamps.append(int(timestamp))
+        if not changed:
+            return version, False, {}, {}
+
+        # Points before the first added point are not read, no point is read if there is not any
+        since = min(timestamps) - 1 if timestamps else sys.maxsize
+        chart_data = self.get(namad_id, resolution=resolution, since=since)
+        return version, False, chart_data, dict(changed)
+
+    def get_json(self, namad_id, render, resolution=None, since=None):
+        """
+        This function will return rendered JSON of namad's chart data. Data of default parameters is
+        rendered once and kept in redis with its version until the next write of namad's data.
+        :param namad_id: id of specific namad
+        :param render: function which converts raw chart data to the returned data
+        :param resolution: resolution of series, see `get`
+        :param since: time in milliseconds, see `get`
+        :return: tuple of version and JSON bytes
+        """
+        cached = resolution is None and since is None
+        key = self.key(namad_id, 'json')
+        if cached:
+            pipeline = redis_connection.pipeline()
+            pipeline.get(self.key(namad_id, 'version'))
+            pipeline.get(key)
+            version, content = pipeline.execute()
+            if content is not None:
+                content_version, content = content.split(b'\n', 1)
+                # Rendered JSON of an older version is not returned, Ex: it is rendered during a write
+                if content_version == (version or b'0'):
+                    return int(content_version), content
+
+        version, chart_data = self.get(namad_id, resolution=resolution, since=since, with_version=True)
+        content = dump_json(render(chart_data))
+        if cached:
+            redis_connection.set(key, b'%d\n' % version + content, ex=JSON_TIMEOUT)
+        return version, content
+
+    def delete_many(self, namad_ids):
+        """
+        This function will delete data of namads, their versions are kept and incremented.
+        :param namad_ids: list of namad ids
+        :return: count of deleted redis keys
+        """
+        keys = [
+            key for namad_id in namad_ids
+            for key in (
+                *(self.key(namad_id, k) for k in (*CHART_PARTS, 'json', 'changes')), *self._series_keys(namad_id)
+            )
+        ]
+        if not keys:
+            return 0
+
+        pipeline = redis_connection.pipeline()
+        pipeline.delete(*keys)
+        for namad_id in namad_ids:
+            self._write(pipeline, namad_id, {}, reset=True)
+        return pipeline.execute()[0]
+
+
+namad_chart_cache = NamadChartCache()
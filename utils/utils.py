@@ -8,6 +8,7 @@ from django.contrib import admin
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
+from django_redis import get_redis_connection
 from khayyam import JalaliDatetime
 
 from rest_framework import serializers
@@ -17,6 +18,7 @@ from apps.transactions.api.serializers import PurchasePackageSerializer
 from apps.transactions.models import PurchasePackage
 
 redis_cache = caches['redis']
+redis_connection = get_redis_connection('redis')
 logger = logging.getLogger('accounts')
 
 
@@ -221,30 +223,10 @@ class JalaliTimeMixin:
         return ''
 
 
-def update_namad_data(namad_id, key, data, clear=False):
+def redis_key(*parts):
     """
-    This function will update namad's data in redis cache
-    :param namad_id: id of specific namad
-    :param key: key of namad's data dict which should be updated
-    :param data: data of specific key in cached data
-    :param clear: determine if sections data should be cleared
-    :return:
+    This function will make a prefixed key for raw redis commands
+    :param parts: parts of the key
+    :return: key which is joined by colon, Ex: HAMIBOURSE:tsetmc:fingerprints
     """
-    appendable = {
-        'sections': ['money_entry_graph'],
-    }
-
-    to_update_data = redis_cache.get(namad_id, {})
-    sub_data = to_update_data.get(key, {})
-
-    for k in appendable.get(key, []):
-        if not clear:
-            _d = sub_data.get(k, [])
-            _d.append(data[k])
-        else:
-            _d = []
-        data[k] = _d
-
-    sub_data.update(data)
-    to_update_data[key] = sub_data
-    redis_cache.set(namad_id, to_update_data)
+    return ':'.join(str(p) for p in (settings.CACHE_KEY_PREFIX, *parts))